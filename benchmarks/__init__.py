@@ -0,0 +1,3 @@
+# Benchmarks of the interpret. Workloads are generated by benchmarks.generate, run and compared to the stored
+# baseline by benchmarks.run. Handlers of single instructions are measured by benchmarks.opcodes.
+# Loading of large programs is measured by benchmarks.bench_load.
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# filename: bench_load.py
+# Measures how long the interpret needs to load programs of growing size. The generated programs start
+# with EXIT, so the measured time consists of interpret startup, XML parsing, validation, compilation and
+# label pass only. Time per instruction should stay roughly the same for all sizes.
+#
+# usage: python benchmarks/bench_load.py [max_size]
+
+import os
+import sys
+import subprocess
+import tempfile
+import time
+
+INTERPRET = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "interpret.py")
+
+SIZES = [1000, 10000, 100000, 1000000]
+
+
+# writes program with given number of instructions mixing all kinds of arguments, labels and jumps
+def write_program(file, size):
+    file.write('<?xml version="1.0" encoding="UTF-8"?>\n<program language="IPPcode20">\n')
+    file.write('<instruction order="1" opcode="EXIT"><arg1 type="int">0</arg1></instruction>\n')
+
+    for order in range(2, size + 1):
+        if order % 5 == 0:
+            file.write('<instruction order="%d" opcode="LABEL"><arg1 type="label">l%d</arg1></instruction>\n' % (order, order))
+        elif order % 5 == 1:
+            file.write('<instruction order="%d" opcode="JUMPIFEQ"><arg1 type="label">l%d</arg1>'
+                       '<arg2 type="var">GF@a</arg2><arg3 type="int">%d</arg3></instruction>\n' % (order, order - 1, order))
+        elif order % 5 == 2:
+            file.write('<instruction order="%d" opcode="ADD"><arg1 type="var">LF@b</arg1>'
+                       '<arg2 type="var">GF@a</arg2><arg3 type="int">%d</arg3></instruction>\n' % (order, order))
+        elif order % 5 == 3:
+            file.write('<instruction order="%d" opcode="CONCAT"><arg1 type="var">TF@c</arg1>'
+                       '<arg2 type="string">s\\032%d</arg2><arg3 type="var">GF@d</arg3></instruction>\n' % (order, order))
+        else:
+            file.write('<instruction order="%d" opcode="WRITE"><arg1 type="float">0x1.%xp+1</arg1></instruction>\n' % (order, order))
+
+    file.write('</program>\n')
+
+
+# returns wall time of interpretation of the program
+def measure(path):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, INTERPRET, "--source=" + path], stdin=subprocess.DEVNULL)
+    elapsed = time.perf_counter() - start
+
+    if result.returncode != 0:
+        sys.exit("interpret failed with exit code " + str(result.returncode))
+    return elapsed
+
+
+def main():
+    max_size = int(sys.argv[1]) if len(sys.argv) > 1 else SIZES[-1]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "empty.xml")
+        with open(path, "w") as file:
+            write_program(file, 1)
+        startup = measure(path)
+        print("startup: %.3f s" % startup)
+        print("%10s %10s %16s" % ("size", "load [s]", "per inst [us]"))
+
+        for size in SIZES:
+            if size > max_size: break
+
+            path = os.path.join(directory, str(size) + ".xml")
+            with open(path, "w") as file:
+                write_program(file, size)
+
+            load = max(measure(path) - startup, 0.0)
+            print("%10d %10.3f %16.2f" % (size, load, load / size * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# filename: generate.py
+# Generates parameterized IPPcode20 programs used as benchmark workloads. Every workload is a function of
+# its size, that returns list of instructions and text given to the program on its input. Instructions are
+# tuples of opcode and arguments written as in IPPcode20 source (GF@x, int@1, string@a\032b), labels and
+# types are written as label@name and type@name.
+#
+# usage: python -m benchmarks.generate workload size [input_file] > program.xml
+
+import sys
+from xml.sax.saxutils import escape
+
+# default sizes of workloads, chosen so every workload runs for a similar time
+SIZES = {
+    "loop": 200000,
+    "recursion": 20000,
+    "strings": 10000,
+    "stack": 100000,
+    "io": 50000,
+}
+
+
+# counted loop with arithmetic on global variables
+def loop(size):
+    program = [
+        ("DEFVAR", "GF@i"),
+        ("DEFVAR", "GF@sum"),
+        ("MOVE", "GF@i", "int@0"),
+        ("MOVE", "GF@sum", "int@0"),
+        ("LABEL", "label@loop"),
+        ("ADD", "GF@sum", "GF@sum", "GF@i"),
+        ("ADD", "GF@i", "GF@i", "int@1"),
+        ("JUMPIFNEQ", "label@loop", "GF@i", "int@%d" % size),
+        ("WRITE", "GF@sum"),
+    ]
+    return program, ""
+
+
+# recursive function, every call gets its own local frame with the argument
+def recursion(size):
+    program = [
+        ("DEFVAR", "GF@result"),
+        ("CREATEFRAME",),
+        ("DEFVAR", "TF@n"),
+        ("MOVE", "TF@n", "int@%d" % size),
+        ("CALL", "label@sum"),
+        ("POPS", "GF@result"),
+        ("WRITE", "GF@result"),
+        ("EXIT", "int@0"),
+
+        ("LABEL", "label@sum"),
+        ("PUSHFRAME",),
+        ("JUMPIFNEQ", "label@recurse", "LF@n", "int@0"),
+        ("PUSHS", "int@0"),
+        ("POPFRAME",),
+        ("RETURN",),
+        ("LABEL", "label@recurse"),
+        ("DEFVAR", "LF@m"),
+        ("SUB", "LF@m", "LF@n", "int@1"),
+        ("CREATEFRAME",),
+        ("DEFVAR", "TF@n"),
+        ("MOVE", "TF@n", "LF@m"),
+        ("CALL", "label@sum"),
+        ("PUSHS", "LF@n"),
+        ("ADDS",),
+        ("POPFRAME",),
+        ("RETURN",),
+    ]
+    return program, ""
+
+
+# string building by concatenation, followed by rewriting all its characters
+def strings(size):
+    program = [
+        ("DEFVAR", "GF@s"),
+        ("DEFVAR", "GF@i"),
+        ("DEFVAR", "GF@length"),
+        ("MOVE", "GF@s", "string@"),
+        ("MOVE", "GF@i", "int@0"),
+        ("LABEL", "label@build"),
+        ("CONCAT", "GF@s", "GF@s", "string@a"),
+        ("ADD", "GF@i", "GF@i", "int@1"),
+        ("JUMPIFNEQ", "label@build", "GF@i", "int@%d" % size),
+        ("STRLEN", "GF@length", "GF@s"),
+        ("MOVE", "GF@i", "int@0"),
+        ("LABEL", "label@rewrite"),
+        ("SETCHAR", "GF@s", "GF@i", "string@b"),
+        ("ADD", "GF@i", "GF@i", "int@1"),
+        ("JUMPIFNEQ", "label@rewrite", "GF@i", "GF@length"),
+        ("WRITE", "GF@length"),
+    ]
+    return program, ""
+
+
+# arithmetic and comparisons on the data stack
+def stack(size):
+    program = [
+        ("DEFVAR", "GF@i"),
+        ("DEFVAR", "GF@x"),
+        ("MOVE", "GF@i", "int@0"),
+        ("MOVE", "GF@x", "int@0"),
+        ("LABEL", "label@loop"),
+        ("PUSHS", "GF@x"),
+        ("PUSHS", "GF@i"),
+        ("PUSHS", "int@3"),
+        ("MULS",),
+        ("ADDS",),
+        ("PUSHS", "int@2"),
+        ("IDIVS",),
+        ("POPS", "GF@x"),
+        ("PUSHS", "GF@i"),
+        ("PUSHS", "int@1"),
+        ("ADDS",),
+        ("POPS", "GF@i"),
+        ("PUSHS", "GF@i"),
+        ("PUSHS", "int@%d" % size),
+        ("JUMPIFNEQS", "label@loop"),
+        ("WRITE", "GF@x"),
+    ]
+    return program, ""
+
+
+# reading of lines with numbers and strings, that are all written back
+def io(size):
+    program = [
+        ("DEFVAR", "GF@number"),
+        ("DEFVAR", "GF@text"),
+        ("DEFVAR", "GF@type"),
+        ("LABEL", "label@loop"),
+        ("READ", "GF@number", "type@int"),
+        ("TYPE", "GF@type", "GF@number"),
+        ("JUMPIFEQ", "label@end", "GF@type", "string@nil"),
+        ("READ", "GF@text", "type@string"),
+        ("WRITE", "GF@number"),
+        ("WRITE", "string@\\032"),
+        ("WRITE", "GF@text"),
+        ("WRITE", "string@\\010"),
+        ("JUMP", "label@loop"),
+        ("LABEL", "label@end"),
+    ]
+    text = "".join("%d\nline %d\n" % (number, number) for number in range(size // 2))
+    return program, text
+
+
+WORKLOADS = {
+    "loop": loop,
+    "recursion": recursion,
+    "strings": strings,
+    "stack": stack,
+    "io": io,
+}
+
+
+# writes instructions as IPPcode20 XML program
+def write_xml(file, program):
+    file.write('<?xml version="1.0" encoding="UTF-8"?>\n<program language="IPPcode20">\n')
+
+    for order, (opcode, *arguments) in enumerate(program, 1):
+        file.write('<instruction order="%d" opcode="%s">' % (order, opcode))
+        for number, argument in enumerate(arguments, 1):
+            prefix, value = argument.split("@", 1)
+            if prefix in ("GF", "LF", "TF"):
+                arg_type, value = "var", argument
+            else:
+                arg_type = prefix
+            file.write('<arg%d type="%s">%s</arg%d>' % (number, arg_type, escape(value), number))
+        file.write('</instruction>\n')
+
+    file.write('</program>\n')
+
+
+# writes workload of given size to program and input files
+def generate(workload, size, program_file, input_file):
+    program, text = WORKLOADS[workload](size)
+    write_xml(program_file, program)
+    input_file.write(text)
+
+
+def main():
+    if len(sys.argv) not in (3, 4) or sys.argv[1] not in WORKLOADS:
+        sys.exit("usage: python -m benchmarks.generate {%s} size [input_file]" % ",".join(WORKLOADS))
+
+    program, text = WORKLOADS[sys.argv[1]](int(sys.argv[2]))
+    write_xml(sys.stdout, program)
+    if len(sys.argv) == 4:
+        with open(sys.argv[3], "w") as file:
+            file.write(text)
+
+
+if __name__ == "__main__":
+    main()
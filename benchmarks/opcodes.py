@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# filename: opcodes.py
+# Times every instruction handler of the interpret on its own, with constant operands and with variables of
+# every frame kind, for every type the instruction accepts. Handlers are called directly on an interpreter
+# with compiled arguments, so the measured cost consists of the handler, operand decoding and type checks only.
+#
+# Costs are compared to the checked-in thresholds. To make the thresholds usable on other machines and
+# less sensitive to noise, every run of a handler is paired with a run of an empty function and the cost
+# is kept relative to it, median of the repeated runs is compared. The run fails, when a handler gets
+# slower by more than the tolerance.
+#
+# usage: python -m benchmarks.opcodes [--number=n] [--repeat=n] [--tolerance=percent] [--thresholds=file]
+#                                     [--json=file] [--save] [opcode...]
+
+import os
+import io
+import sys
+import getopt
+import json
+import time
+import importlib.util
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+INTERPRET = os.path.join(DIRECTORY, os.pardir, "interpret.py")
+THRESHOLDS = os.path.join(DIRECTORY, "opcode_thresholds.json")
+
+spec = importlib.util.spec_from_file_location("interpret", INTERPRET)
+interpret = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(interpret)
+
+CONST, GF, LF, TF = interpret.CONST, interpret.GF, interpret.LF, interpret.TF
+
+# value of every type, every frame has a variable of each type named by the type and a destination variable
+VALUES = {"nil": None, "bool": True, "int": 7, "float": 1.5, "string": "hello world"}
+SLOTS = {name: slot for slot, name in enumerate(list(VALUES) + ["dest"])}
+
+TYPES = tuple(VALUES)
+
+# instructions with destination and one or two operands, and types of the operands to measure
+UNARY = {
+    "MOVE": TYPES,
+    "NOT": ("bool",),
+    "INT2CHAR": ("int",),
+    "INT2FLOAT": ("int",),
+    "FLOAT2INT": ("float",),
+    "STRLEN": ("string",),
+    "TYPE": TYPES,
+}
+
+BINARY = {
+    "ADD": ("int", "float"),
+    "SUB": ("int", "float"),
+    "MUL": ("int", "float"),
+    "DIV": ("float",),
+    "IDIV": ("int",),
+    "LT": ("int", "bool", "float", "string"),
+    "GT": ("int", "bool", "float", "string"),
+    "EQ": ("int", "nil", "bool", "float", "string"),
+    "AND": ("bool",),
+    "OR": ("bool",),
+    "CONCAT": ("string",),
+}
+
+# values, that are on the data stack before a stack instruction is executed
+STACK = {
+    "ADDS": (7, 3),
+    "SUBS": (7, 3),
+    "MULS": (7, 3),
+    "IDIVS": (7, 3),
+    "LTS": (7, 3),
+    "GTS": (7, 3),
+    "EQS": (7, 3),
+    "ANDS": (True, False),
+    "ORS": (True, False),
+    "NOTS": (True,),
+    "INT2CHARS": (65,),
+    "STRI2INTS": ("hello", 1),
+    "JUMPIFEQS": (7, 3),
+    "JUMPIFNEQS": (7, 3),
+}
+
+
+def const(value_type):
+    return (CONST, VALUES[value_type])
+
+
+def var(frame, name):
+    return (frame, SLOTS[name])
+
+
+# returns fresh frame with all variables initialized
+def new_frame():
+    return list(VALUES.values()) + [0]
+
+
+# output, that discards everything written, without a file, that would stay open
+class NullOutput:
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+
+# returns interpreter for a measured run with all frames existing, input contains enough lines for every READ.
+# Output of WRITE and DPRINT is not part of the measurement
+def new_interpreter(number):
+    program = interpret.Program()
+    program.gf_slots.update(SLOTS)
+    program.local_slots.update(SLOTS)
+
+    interpreter = interpret.Interpreter(program, io.BytesIO(b"7\n" * number), NullOutput(), NullOutput())
+    interpreter.gf = new_frame()
+    interpreter.lf = [new_frame()]
+    interpreter.tf = new_frame()
+    return interpreter
+
+
+# returns measured cases as (name, opcode, arguments, setup). Setup is called with the interpreter before every
+# call of the handler and its own cost is subtracted
+def cases():
+    result = [("LABEL", "LABEL", ("label",), None)]
+
+    for opcode, types in UNARY.items():
+        for value_type in types:
+            result.append(("%s %s const" % (opcode, value_type), opcode, (var(GF, "dest"), const(value_type)), None))
+        for frame, name in ((GF, "GF"), (LF, "LF"), (TF, "TF")):
+            result.append(("%s %s %s" % (opcode, types[0], name), opcode, (var(frame, "dest"), var(frame, types[0])), None))
+
+    for opcode, types in BINARY.items():
+        for value_type in types:
+            result.append(("%s %s const" % (opcode, value_type), opcode,
+                           (var(GF, "dest"), const(value_type), const(value_type)), None))
+        for frame, name in ((GF, "GF"), (LF, "LF"), (TF, "TF")):
+            result.append(("%s %s %s" % (opcode, types[0], name), opcode,
+                           (var(frame, "dest"), var(frame, types[0]), var(frame, types[0])), None))
+
+    for frame, name in ((CONST, "const"), (GF, "GF"), (LF, "LF"), (TF, "TF")):
+        string = const("string") if frame == CONST else var(frame, "string")
+        index = (CONST, 1) if frame == CONST else var(frame, "int")
+        result.append(("STRI2INT " + name, "STRI2INT", (var(GF, "dest"), string, index), None))
+        result.append(("GETCHAR " + name, "GETCHAR", (var(GF, "dest"), string, index), None))
+        result.append(("JUMPIFEQ int " + name, "JUMPIFEQ", (0, index, index), None))
+        result.append(("JUMPIFNEQ int " + name, "JUMPIFNEQ", (0, index, index), None))
+        if frame != CONST:
+            result.append(("SETCHAR " + name, "SETCHAR", (var(frame, "string"), (CONST, 1), (CONST, "a")), None))
+            result.append(("POPS " + name, "POPS", (var(frame, "dest"),), lambda interpreter: interpreter.data_stack.append(7)))
+            result.append(("DEFVAR " + name, "DEFVAR", (var(frame, "dest"),),
+                           lambda interpreter, frame=frame: undeclare(interpreter, frame)))
+            for read_type in interpret.READ_TYPES:
+                result.append(("READ %s %s" % (read_type, name), "READ", (var(frame, "dest"), read_type), None))
+
+    for value_type in TYPES:
+        result.append(("PUSHS %s const" % value_type, "PUSHS", (const(value_type),), None))
+        result.append(("WRITE %s const" % value_type, "WRITE", (const(value_type),), None))
+        result.append(("DPRINT %s const" % value_type, "DPRINT", (const(value_type),), None))
+    for frame, name in ((GF, "GF"), (LF, "LF"), (TF, "TF")):
+        result.append(("PUSHS int " + name, "PUSHS", (var(frame, "int"),), None))
+        result.append(("WRITE int " + name, "WRITE", (var(frame, "int"),), None))
+
+    for opcode, values in STACK.items():
+        arguments = (0,) if opcode.startswith("JUMP") else ()
+        result.append((opcode, opcode, arguments, lambda interpreter, values=values: interpreter.data_stack.extend(values)))
+
+    result += [
+        ("CLEARS", "CLEARS", (), None),
+        ("JUMP", "JUMP", (0,), None),
+        ("CALL", "CALL", (0,), None),
+        ("RETURN", "RETURN", (), lambda interpreter: interpreter.pc_stack.append(0)),
+        ("CREATEFRAME", "CREATEFRAME", (), None),
+        ("PUSHFRAME", "PUSHFRAME", (), lambda interpreter, frame=new_frame(): setattr(interpreter, "tf", frame)),
+        ("POPFRAME", "POPFRAME", (), lambda interpreter, frame=new_frame(): interpreter.lf.append(frame)),
+    ]
+    # EXIT and BREAK end the program or dump the whole state, they are not measured
+    return result
+
+
+# removes destination variable from the frame, so it can be defined again
+def undeclare(interpreter, frame):
+    interpreter.get_frame(frame)[SLOTS["dest"]] = interpret.UNDECLARED
+
+
+# returns wall time of number calls of the handler in seconds, without the cost of the setup
+def time_handler(handler, arguments, setup, number):
+    clock = time.perf_counter
+
+    interpreter = new_interpreter(number)
+    if setup is None:
+        start = clock()
+        for _ in range(number):
+            handler(interpreter, arguments)
+        return clock() - start
+
+    start = clock()
+    for _ in range(number):
+        setup(interpreter)
+        handler(interpreter, arguments)
+    elapsed = clock() - start
+
+    interpreter = new_interpreter(number)
+    start = clock()
+    for _ in range(number):
+        setup(interpreter)
+    return max(elapsed - (clock() - start), 0.0)
+
+
+def empty(interpreter, arguments):
+    pass
+
+
+# returns cost of one call in nanoseconds, the best of repeated runs, and median of costs relative to
+# a call of an empty function
+def measure(handler, arguments, setup, number, repeat):
+    costs = []
+    ratios = []
+    for _ in range(repeat):
+        reference = time_handler(empty, (), None, number)
+        cost = time_handler(handler, arguments, setup, number)
+        costs.append(cost)
+        ratios.append(cost / reference)
+
+    return min(costs) / number * 1e9, sorted(ratios)[len(ratios) // 2]
+
+
+def main():
+    options = ["number=", "repeat=", "tolerance=", "thresholds=", "json=", "save"]
+    try:
+        opts, opcodes = getopt.gnu_getopt(sys.argv[1:], "", options)
+    except getopt.error as error:
+        sys.exit(str(error))
+
+    number = 10000
+    repeat = 7
+    tolerance = None
+    thresholds_path = THRESHOLDS
+    json_path = None
+    save = False
+
+    for option, value in opts:
+        if option == "--number":
+            number = int(value)
+        elif option == "--repeat":
+            repeat = int(value)
+        elif option == "--tolerance":
+            tolerance = float(value)
+        elif option == "--thresholds":
+            thresholds_path = value
+        elif option == "--json":
+            json_path = value
+        elif option == "--save":
+            save = True
+
+    opcodes = {opcode.upper() for opcode in opcodes}
+    for opcode in opcodes:
+        if opcode not in interpret.INSTRUCTIONS:
+            sys.exit("unknown opcode " + opcode)
+
+    thresholds = {"tolerance": 40.0, "costs": {}}
+    if os.path.exists(thresholds_path):
+        with open(thresholds_path) as file:
+            thresholds = json.load(file)
+    if tolerance is None:
+        tolerance = thresholds["tolerance"]
+
+    reference = measure(empty, (), None, number, repeat)[0]
+    print("reference call: %.1f ns" % reference)
+    print("%-24s %10s %10s %10s %9s" % ("case", "cost [ns]", "relative", "threshold", "change"))
+
+    costs = {}
+    regressions = []
+    for name, opcode, arguments, setup in cases():
+        if opcodes and opcode not in opcodes: continue
+
+        cost, relative = measure(interpret.INSTRUCTIONS[opcode][0], arguments, setup, number, repeat)
+        costs[name] = round(relative, 3)
+
+        threshold = thresholds["costs"].get(name)
+        if threshold is None:
+            print("%-24s %10.1f %10.2f" % (name, cost, relative))
+            continue
+
+        change = (relative - threshold) / threshold * 100
+        regressed = change > tolerance
+        if regressed:
+            regressions.append(name)
+        print("%-24s %10.1f %10.2f %10.2f %+8.1f%%%s" % (name, cost, relative, threshold, change, " !" if regressed else ""))
+
+    if json_path is not None:
+        with open(json_path, "w") as file:
+            json.dump({"reference_ns": reference, "costs": costs}, file, indent=4)
+            file.write("\n")
+
+    if save:
+        thresholds["costs"].update(costs)
+        with open(thresholds_path, "w") as file:
+            json.dump(thresholds, file, indent=4, sort_keys=True)
+            file.write("\n")
+        return
+
+    if regressions:
+        sys.exit("%d handlers slower by more than %g%%: %s" % (len(regressions), tolerance, ", ".join(regressions)))
+
+
+if __name__ == "__main__":
+    main()
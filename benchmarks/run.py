@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# filename: run.py
+# Runs generated workloads with the interpret and reports startup time, executed instructions per second
+# and peak memory of every workload. Numbers are taken from --metrics of the interpret, every workload is
+# run several times and the best run is reported. Results are compared to the stored baseline, run fails
+# when a workload gets slower or bigger by more than the tolerance.
+#
+# usage: python -m benchmarks.run [--interpret=file] [--repeat=n] [--scale=x] [--tolerance=percent]
+#                                 [--baseline=file] [--save] [workload...]
+
+import os
+import sys
+import getopt
+import json
+import subprocess
+import tempfile
+import time
+
+from benchmarks import generate
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+INTERPRET = os.path.join(DIRECTORY, os.pardir, "interpret.py")
+BASELINE = os.path.join(DIRECTORY, "baseline.json")
+
+# compared results of workloads, True when higher value is better
+RESULTS = {
+    "instructions_per_second": True,
+    "peak_rss_bytes": False,
+}
+
+
+# runs the interpret and returns its wall time and metrics
+def measure(interpret, program, input_path, directory):
+    metrics_path = os.path.join(directory, "metrics.txt")
+    command = [sys.executable, interpret, "--source=" + program, "--input=" + input_path, "--metrics=" + metrics_path]
+
+    start = time.perf_counter()
+    result = subprocess.run(command, stdout=subprocess.DEVNULL)
+    elapsed = time.perf_counter() - start
+
+    if result.returncode != 0:
+        sys.exit("interpret failed on %s with exit code %d" % (program, result.returncode))
+    return elapsed, read_metrics(metrics_path)
+
+
+# returns samples of OpenMetrics file as dictionary, labels are kept in the names
+def read_metrics(path):
+    metrics = {}
+    with open(path) as file:
+        for line in file:
+            if line.startswith("#"): continue
+            name, value = line.rsplit(" ", 1)
+            metrics[name] = float(value)
+    return metrics
+
+
+# runs workload repeatedly and returns its best results
+def run_workload(interpret, workload, size, repeat, directory):
+    program = os.path.join(directory, workload + ".xml")
+    input_path = os.path.join(directory, workload + ".in")
+    with open(program, "w") as program_file, open(input_path, "w") as input_file:
+        generate.generate(workload, size, program_file, input_file)
+
+    runs = [measure(interpret, program, input_path, directory)[1] for _ in range(repeat)]
+    return {
+        "size": size,
+        "instructions": int(runs[0]["ipp_instructions_total"]),
+        "instructions_per_second": max(run["ipp_instructions_per_second"] for run in runs),
+        "peak_rss_bytes": min(run.get("ipp_peak_rss_bytes", 0) for run in runs),
+    }
+
+
+# prints comparison of one result with the baseline and returns, whether it regressed
+def compare(workload, name, old, new, higher_is_better, tolerance):
+    change = (new - old) / old * 100 if old else 0.0
+    regressed = -change > tolerance if higher_is_better else change > tolerance
+    print("%-10s %-24s %16.6g %16.6g %+8.1f%%%s" % (workload, name, old, new, change, " !" if regressed else ""))
+    return regressed
+
+
+def main():
+    options = ["interpret=", "repeat=", "scale=", "tolerance=", "baseline=", "save"]
+    try:
+        opts, workloads = getopt.gnu_getopt(sys.argv[1:], "", options)
+    except getopt.error as error:
+        sys.exit(str(error))
+
+    interpret = INTERPRET
+    repeat = 3
+    scale = 1.0
+    tolerance = 10.0
+    baseline_path = BASELINE
+    save = False
+
+    for option, value in opts:
+        if option == "--interpret":
+            interpret = value
+        elif option == "--repeat":
+            repeat = int(value)
+        elif option == "--scale":
+            scale = float(value)
+        elif option == "--tolerance":
+            tolerance = float(value)
+        elif option == "--baseline":
+            baseline_path = value
+        elif option == "--save":
+            save = True
+
+    for workload in workloads:
+        if workload not in generate.WORKLOADS:
+            sys.exit("unknown workload " + workload)
+    workloads = workloads or list(generate.WORKLOADS)
+
+    workload_results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        # startup is measured on a program, that exits right away
+        program = os.path.join(directory, "empty.xml")
+        input_path = os.path.join(directory, "empty.in")
+        with open(program, "w") as program_file, open(input_path, "w"):
+            generate.write_xml(program_file, [("EXIT", "int@0")])
+        startup = min(measure(interpret, program, input_path, directory)[0] for _ in range(repeat))
+
+        print("%-10s %10s %12s %14s %12s %10s" % ("workload", "size", "instructions", "inst/s", "peak [MiB]", "startup [s]"))
+        for workload in workloads:
+            size = max(int(generate.SIZES[workload] * scale), 1)
+            result = run_workload(interpret, workload, size, repeat, directory)
+            workload_results[workload] = result
+            print("%-10s %10d %12d %14.0f %12.1f %10.3f" % (workload, size, result["instructions"],
+                  result["instructions_per_second"], result["peak_rss_bytes"] / 2 ** 20, startup))
+
+    results = {"startup": startup, "workloads": workload_results}
+    if save:
+        with open(baseline_path, "w") as file:
+            json.dump(results, file, indent=4, sort_keys=True)
+            file.write("\n")
+        return
+
+    if not os.path.exists(baseline_path):
+        return
+
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+
+    print()
+    print("%-10s %-24s %16s %16s %9s" % ("workload", "result", "baseline", "current", "change"))
+
+    regressions = []
+    if compare("", "startup", baseline["startup"], startup, False, tolerance):
+        regressions.append("startup")
+
+    # workloads of different size, e.g. run with other --scale, are not comparable
+    for workload, result in workload_results.items():
+        old = baseline["workloads"].get(workload)
+        if old is None or old["size"] != result["size"]: continue
+
+        for name, higher_is_better in RESULTS.items():
+            if compare(workload, name, old[name], result[name], higher_is_better, tolerance):
+                regressions.append(workload + " " + name)
+
+    if regressions:
+        sys.exit("regressions over %g%%: %s" % (tolerance, ", ".join(regressions)))
+
+
+if __name__ == "__main__":
+    main()
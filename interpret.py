@@ -9,1184 +9,2681 @@ import xml.etree.ElementTree as XML
 import sys
 import getopt
 import re
+import os
+import stat
+import io
+import functools
+import marshal
+import mmap
+import time
+import threading
+import bisect
+import signal
+import operator
+import collections
 from enum import Enum
 
-TOP = -1
-
-def main():
-    # ==================================== argument parsing ====================================
-    options = ["help", "source=", "input=", "stats=", "insts", "vars"]             # possible arguments
-    try:
-        # arguments with value will be stored in opts and arguments without value will be stored in args
-        opts, args = getopt.getopt(sys.argv[1:], "", options)
-    except getopt.error:
-        # if argument, that is not in options list, is given.
-        exit(10)
-
-    input_not_added = True
-    source_not_added = True
-    stats_not_added = True
-
-    insts = False
-    vars = False
-
-    global input_arg
-    input_arg = sys.stdin
-    source_arg = sys.stdin
-    stats_arg = None
+try:
+    import resource
+except ImportError:
+    # peak memory is not reported in metrics on platforms without resource module
+    resource = None
 
-    # redirecting input based on arguments
-    for option, value in opts:
-        if option in ("--source",):
-            source_not_added = False
-            source_arg = value
-        elif option in ("--input",):
-            input_not_added = False
-            input_arg = value
-        elif option in ("--help",):
-            if source_not_added and input_not_added:
-                help()
-            else:
-                exit(10)
-        elif option in ("--stats",):
-            stats_not_added = False
-            stats_arg = value
-        elif option in ("--insts",):
-            insts = True
-        elif option in ("--vars",):
-            vars = True
+TOP = -1
 
+# kinds of compiled operands, variables are kinds by their frame
+CONST = 0
+GF = 1
+LF = 2
+TF = 3
 
-    if (source_not_added and input_not_added) or opts is None:
-        # --source or --input must always be given
-        exit(10)
+FRAMES = {"GF": GF, "LF": LF, "TF": TF}
 
-    if input_arg != sys.stdin:
-        try:
-            global input_words
-            input_file = open(input_arg, 'r')
-            for line in input_file:
-                input_words.append(line)
-        except IOError:
-            exit(11)
+# types of XML arguments accepted by kinds of arguments in instruction table
+ARGUMENT_TYPES = {
+    "var"   : ("var",),
+    "symb"  : ("var", "nil", "bool", "int", "float", "string"),
+    "label" : ("label",),
+    "type"  : ("type",)
+}
 
+# types, that can be read by READ instruction
+READ_TYPES = ("int", "string", "bool", "float")
 
-    # ============ STATI ============
-    if insts and stats_not_added:
-        exit(10)
+# formatting of values written by WRITE instruction
+WRITE_FORMATS = {
+    type(None)  : lambda value: "",
+    bool        : lambda value: "true" if value else "false",
+    int         : str,
+    float       : float.hex,
+    str         : str
+}
 
-    if vars and stats_not_added:
-        exit(10)
+# header of files in the compiled program cache, followed by SHA-256 of the content
+CACHE_MAGIC = b"IPPcode20 compiled 1\n"
 
+# escape sequence \ddd in string literals, backslash without three digits is invalid
+ESCAPE_SEQUENCE = re.compile(r"\\(\d{3})?")
 
-    # ==================================== XML parsing ====================================
+# content of frame slots of variables, that were not defined by DEFVAR or were defined, but not initialized yet
+UNDECLARED = object()
+UNINITIALIZED = object()
 
-    try:
-        tree = XML.parse(source_arg)
-        program = tree.getroot()
-    except:
-        exit(31)
+# names of IPPcode20 types of values stored in the interpret
+TYPE_NAMES = {type(None): "nil", bool: "bool", int: "int", float: "float", str: "string"}
 
 
-    if program.tag != "program": exit(32)
-    program = sort_xml(program)
+# errors of the interpretation, every error carries exit code of the interpret
+class InterpretError(Exception):
+    code = 99
+    message = "unexpected internal error"
 
-    if not xml_structure_ok(program): exit(32)
+    def __init__(self, message=None):
+        super().__init__(self.message if message is None else message)
 
-    # first pass through to define all labels...
 
-    global pc
-    global instruction_counter
+class ArgumentError(InterpretError):
+    code = 10
+    message = "missing argument or forbidden argument combination"
 
-    while pc < len(program):
-        if program[pc].attrib["opcode"] == "LABEL":
-            check_label(program[pc])
-            instruction_counter += 1
-        pc += 1
 
-    global orders
-    orders = []
+class InputFileError(InterpretError):
+    code = 11
+    message = "could not open an input file"
 
 
-    # second pass through to execute the rest of the instructions
-    pc = 0
-    while pc < len(program):
-        instruction_switch(program[pc])
-        instruction_counter += 1
-        pc += 1
+class OutputFileError(InterpretError):
+    code = 12
+    message = "could not open an output file"
 
 
-# ================= STATI ==============
-    if not stats_not_added:
-        try:
-            stats_file = open(stats_arg, 'w')
-        except IOError:
-            exit(12)
-        if insts:
-            stats_file.write(str(instruction_counter) + "\n")
-        if vars:
-            stats_file.write(str(gf_counter + lf_counter + tf_counter) + "\n")
-
-        stats_file.close()
-
-
-
-def instruction_switch(instruction):
-    switcher = {
-        "MOVE"          : check_move,
-        "CREATEFRAME"   : check_createframe,
-        "PUSHFRAME"     : check_pushframe,
-        "POPFRAME"      : check_popframe,
-        "DEFVAR"        : check_defvar,
-        "CALL"          : check_call,
-        "RETURN"        : check_return,
-        "PUSHS"         : check_pushs,
-        "POPS"          : check_pops,
-        "CLEARS"        : check_clears,
-        "ADDS"          : check_adds,
-        "SUBS"          : check_subs,
-        "MULS"          : check_muls,
-        "IDIVS"         : check_idivs,
-        "LTS"           : check_lts,
-        "GTS"           : check_gts,
-        "EQS"           : check_eqs,
-        "ANDS"          : check_ands,
-        "ORS"           : check_ors,
-        "NOTS"          : check_nots,
-        "INT2CHARS"     : check_int2chars,
-        "STRI2INTS"     : check_stri2ints,
-        "JUMPIFEQS"     : check_jumpifeqs,
-        "JUMPIFNEQS"    : check_jumpifneqs,
-        "ADD"           : check_add,
-        "SUB"           : check_sub,
-        "MUL"           : check_mul,
-        "IDIV"          : check_idiv,
-        "DIV"           : check_div,
-        "LT"            : check_lt,
-        "GT"            : check_gt,
-        "EQ"            : check_eq,
-        "AND"           : check_and,
-        "OR"            : check_or,
-        "NOT"           : check_not,
-        "INT2CHAR"      : check_int2char,
-        "STRI2INT"      : check_stri2int,
-        "INT2FLOAT"     : check_int2float,
-        "FLOAT2INT"     : check_float2int,
-        "READ"          : check_read,
-        "WRITE"         : check_write,
-        "CONCAT"        : check_concat,
-        "STRLEN"        : check_strlen,
-        "GETCHAR"       : check_getchar,
-        "SETCHAR"       : check_setchar,
-        "TYPE"          : check_type,
-        "LABEL"         : nothing,
-        "JUMP"          : check_jump,
-        "JUMPIFEQ"      : check_jumpifeq,
-        "JUMPIFNEQ"     : check_jumpifneq,
-        "EXIT"          : check_exit,
-        "DPRINT"        : check_dprint,
-        "BREAK"         : check_break
-    }
-
-    return switcher.get(instruction.attrib['opcode'].upper(), invalid_instruction)(sort_xml(instruction))
-
-
-def nothing(instruction):
-    pass
+class XMLFormatError(InterpretError):
+    code = 31
+    message = "wrong XML file or not well-formed XML"
 
 
-def check_move(instruction):
-    if len(instruction) != 2: exit(32)
+class XMLStructureError(InterpretError):
+    code = 32
+    message = "not expected structure of XML"
 
-    value = get_value(instruction[1])
-    set_value_to_var(instruction[0], value)
 
+class SemanticError(InterpretError):
+    code = 52
+    message = "undefined or redefined label or variable"
 
-def check_createframe(instruction):
-    if len(instruction) != 0: exit(32)
 
-    global tf
-    tf = {}
+class OperandTypeError(InterpretError):
+    code = 53
+    message = "wrong types of operands"
 
 
-def check_pushframe(instruction):
-    if len(instruction) != 0: exit(32)
+class VariableError(InterpretError):
+    code = 54
+    message = "not existing variable access"
 
-    global tf
-    try:
-        lf.append(tf)
-        del tf
-    except NameError:
-        exit(55)
 
+class FrameError(InterpretError):
+    code = 55
+    message = "not existing frame access"
 
-def check_popframe(instruction):
-    if len(instruction) != 0: exit(32)
 
-    if stack_empty(lf):
-        exit(55)
-    else:
-        global tf
-        tf = lf.pop()
+class MissingValueError(InterpretError):
+    code = 56
+    message = "missing value of variable in memory"
 
 
-def check_defvar(instruction):
-    if len(instruction) != 1: exit(32)
+class OperandValueError(InterpretError):
+    code = 57
+    message = "wrong value of operand"
 
-    set_value_to_var(instruction[0], None, "defvar")
 
+class StringError(InterpretError):
+    code = 58
+    message = "error, when processing string"
 
-def check_call(instruction):
-    if len(instruction) != 1: exit(32)
 
-    pc_stack.append(pc)
-    check_jump(instruction)
+# exit code: error
+ERRORS = {error.code: error for error in (InterpretError, ArgumentError, InputFileError, OutputFileError, XMLFormatError,
+                                          XMLStructureError, SemanticError, OperandTypeError, VariableError, FrameError,
+                                          MissingValueError, OperandValueError, StringError)}
 
-def check_return(instruction):
-    if len(instruction) != 0: exit(32)
 
-    if stack_empty(pc_stack):
-        exit(56)
-    else:
-        global pc
-        pc = pc_stack.pop()
+# raises error of the interpretation with given exit code
+def error(code):
+    raise ERRORS[code]()
 
 
-def check_pushs(instruction):
-    if len(instruction) != 1: exit(32)
+# end of the program by EXIT instruction, it is not an error
+class ProgramExit(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
 
-    value = get_value(instruction[0])
-    data_stack.append(value)
 
+# READ of a line, that has not arrived yet to the input of a scheduled instance. The instruction has not changed
+# anything, so it is executed again, when the input arrives
+class InputPending(Exception):
+    pass
 
-def check_pops(instruction):
-    if len(instruction) != 1: exit(32)
 
-    if stack_empty(data_stack):
-        exit(56)
-    else:
-        value = data_stack.pop()
-        set_value_to_var(instruction[0], value)
+def main():
+    timer = PhaseTimer()
 
+    # ==================================== argument parsing ====================================
+    options = ["help", "source=", "input=", "stats=", "insts", "hot", "vars", "stack", "frames", "calls",   # possible arguments
+               "cache=", "line-buffered", "profile=", "flamegraph=", "flamegraph-time=", "sample=", "sample-interval=", "metrics=",
+               "batch=", "jobs=", "batch-output=", "serve=", "serve-cache=", "optimize="]
+    try:
+        # arguments with value will be stored in opts and arguments without value will be stored in args
+        opts, args = getopt.getopt(sys.argv[1:], "", options)
+    except getopt.error:
+        # if argument, that is not in options list, is given.
+        error(10)
 
-def check_clears(instruction):
-    if len(instruction) != 0: exit(32)
+    input_not_added = True
+    source_not_added = True
+    stats_not_added = True
 
-    global data_stack
-    data_stack = []
+    stats = []      # requested statistics in order of arguments
 
+    input_arg = sys.stdin
+    source_arg = sys.stdin
+    stats_arg = None
+    cache_arg = None
+    profile_arg = None
+    flamegraph_arg = None
+    flamegraph_time_arg = None
+    sample_arg = None
+    sample_interval = 5.0
+    metrics_arg = None
+    line_buffered = sys.stdout.isatty()
+    batch_arg = None
+    batch_output_arg = None
+    jobs = os.cpu_count() or 1
+    serve_arg = None
+    serve_cache = 64 << 20
+    optimize = []
 
-def check_adds(instruction):
-    if len(instruction) != 0: exit(32)
+    # redirecting input based on arguments
+    for option, value in opts:
+        if option in ("--source",):
+            source_not_added = False
+            source_arg = value
+        elif option in ("--input",):
+            input_not_added = False
+            input_arg = value
+        elif option in ("--help",):
+            if source_not_added and input_not_added:
+                help()
+            else:
+                error(10)
+        elif option in ("--stats",):
+            stats_not_added = False
+            stats_arg = value
+        elif option in ("--insts", "--hot", "--vars", "--stack", "--frames", "--calls"):
+            stats.append(option[2:])
+        elif option in ("--cache",):
+            cache_arg = value
+        elif option in ("--line-buffered",):
+            line_buffered = True
+        elif option in ("--profile",):
+            profile_arg = value
+        elif option in ("--flamegraph",):
+            flamegraph_arg = value
+        elif option in ("--flamegraph-time",):
+            flamegraph_time_arg = value
+        elif option in ("--sample",):
+            sample_arg = value
+        elif option in ("--sample-interval",):
+            try:
+                sample_interval = float(value)
+            except ValueError:
+                error(10)
+            if sample_interval <= 0: error(10)
+        elif option in ("--metrics",):
+            metrics_arg = value
+        elif option in ("--batch",):
+            batch_arg = value
+        elif option in ("--batch-output",):
+            batch_output_arg = value
+        elif option in ("--jobs",):
+            try:
+                jobs = int(value)
+            except ValueError:
+                error(10)
+            if jobs <= 0: error(10)
+        elif option in ("--serve",):
+            serve_arg = value
+        elif option in ("--serve-cache",):
+            try:
+                serve_cache = int(value)
+            except ValueError:
+                error(10)
+            if serve_cache < 0: error(10)
+        elif option in ("--optimize",):
+            optimize = value.split(",")
+            if not set(optimize) <= set(OPTIMIZATIONS): error(10)
+
+
+    # batch and server modes run many programs instead of one, options of a single run are not available in them
+    if batch_output_arg is not None and batch_arg is None: error(10)
+    if batch_arg is not None or serve_arg is not None:
+        if batch_arg is not None and serve_arg is not None: error(10)
+        if not (source_not_added and input_not_added and stats_not_added) or stats or cache_arg is not None: error(10)
+        if any(arg is not None for arg in (profile_arg, flamegraph_arg, flamegraph_time_arg, sample_arg, metrics_arg)): error(10)
+        if optimize: error(10)
+
+        if batch_arg is not None:
+            return run_batch(batch_arg, jobs, batch_output_arg)
+        return serve(serve_arg, jobs, serve_cache)
 
-    values = read_stack_values(2)
+    if (source_not_added and input_not_added) or opts is None:
+        # --source or --input must always be given
+        error(10)
 
-    if type(values[0]) is int and type(values[1]) is int:
-        data_stack.append(values[0] + values[1])
+    if input_arg != sys.stdin:
+        try:
+            input_file = open(input_arg, 'rb', buffering=1 << 16)
+        except IOError:
+            error(11)
     else:
-        exit(53)
-
+        input_file = sys.stdin.buffer
 
-def check_subs(instruction):
-    if len(instruction) != 0: exit(32)
 
-    values = read_stack_values(2)
+    # ============ STATI ============
+    if stats and stats_not_added:
+        error(10)
 
-    if type(values[0]) is int and type(values[1]) is int:
-        data_stack.append(values[1] - values[0])
-    else:
-        exit(53)
+    # optimized code does not keep identity of every instruction, so only the count of instructions is available
+    if optimize and (set(stats) - {"insts"} or any(arg is not None for arg in (profile_arg, flamegraph_arg, flamegraph_time_arg, sample_arg))):
+        error(10)
 
 
-def check_muls(instruction):
-    if len(instruction) != 0: exit(32)
+    # files of profiling reports are opened before the program is loaded, so the run fails early when they can not be written
+    profile_file = open_report(profile_arg)
+    flamegraph_file = open_report(flamegraph_arg)
+    flamegraph_time_file = open_report(flamegraph_time_arg)
+    sample_file = open_report(sample_arg)
 
-    values = read_stack_values(2)
+    metrics_file = open_report(metrics_arg)
 
-    if type(values[0]) is int and type(values[1]) is int:
-        data_stack.append(values[0] * values[1])
-    else:
-        exit(53)
+    # input is closed on every way out as well, together with its mapping
+    input_reader = InputReader(input_file)
 
+    # metrics are written on every way out, including EXIT instruction and errors, instructions are counted by
+    # the interpreter, that is created when the program is loaded
+    interpreter = None
+    exit_code = 1
+    try:
+        timer.end("arguments")
 
-def check_idivs(instruction):
-    if len(instruction) != 0: exit(32)
 
-    values = read_stack_values(2)
+        # ==================================== XML parsing ====================================
 
-    if type(values[0]) is int and type(values[1]) is int:
-        if values[0] == 0:
-            exit(57)
-        else:
-            data_stack.append(values[1] // values[0])
-    else:
-        exit(53)
+        if source_arg == sys.stdin:
+            source_arg = sys.stdin.buffer
 
+        # already compiled program is taken from the cache, when it is enabled and the program was run before
+        program = None
+        if cache_arg is not None:
+            source_arg, cache_file = open_cache(source_arg, cache_arg)
+            program = read_cache(cache_file)
+            timer.end("cache")
 
-def check_lts(instruction):
-    if len(instruction) != 0: exit(32)
+        if program is None:
+            program = load_program(source_arg, timer)
+            if cache_arg is not None:
+                write_cache(cache_file, program)
+                timer.end("cache")
 
-    values = read_stack_values(2)
+        if optimize:
+            optimize_program(program, optimize)
+            timer.end("optimize")
 
-    if type(values[0]) is not type(values[1]) or values[0] is None or values[1] is None:
-        exit(53)
-    else:
-        data_stack.append(values[1] < values[0])
+        interpreter = Interpreter(program, input_reader, sys.stdout, sys.stderr, line_buffered)
 
+        # second pass through to execute the rest of the instructions
+        profilers = []
+        if profile_file is not None:
+            profilers.append(Profile(program, profile_file, profile_arg.endswith(".json")))
+        if flamegraph_file is not None or flamegraph_time_file is not None:
+            profilers.append(CallGraph(interpreter, flamegraph_file, flamegraph_time_file))
 
-def check_gts(instruction):
-    if len(instruction) != 0: exit(32)
+        # number of instructions is always counted, other statistics are tracked only when requested
+        statistics = None
+        if set(stats) - {"insts"}:
+            statistics = Statistics(interpreter, stats)
 
-    values = read_stack_values(2)
+        # sampler runs in its own thread next to the plain execution loop
+        sampler = None
+        if sample_file is not None:
+            sampler = Sampler(interpreter, sample_file, sample_interval / 1000)
+            sampler.start()
 
-    if type(values[0]) is not type(values[1]) or values[0] is None or values[1] is None:
-        exit(53)
-    else:
-        data_stack.append(values[1] > values[0])
+        # reports are written even when the program ends by an error or by EXIT instruction
+        try:
+            exit_code = interpreter.run(profilers if statistics is None else profilers + [statistics])
+        finally:
+            timer.end("execute")
+            if sampler is not None:
+                sampler.stop()
+                sampler.write()
+            for profiler in profilers:
+                profiler.write()
+
+
+        # ================= STATI ==============
+        if not stats_not_added:
+            try:
+                stats_file = open(stats_arg, 'w')
+            except IOError:
+                error(12)
+            for name in stats:
+                if name == "insts":
+                    stats_file.write(str(interpreter.instruction_counter) + "\n")
+                else:
+                    stats_file.write(str(statistics.value(name)) + "\n")
+
+            stats_file.close()
+            timer.end("stats")
+
+        return exit_code
+    except InterpretError as interpret_error:
+        exit_code = interpret_error.code
+        raise
+    finally:
+        input_reader.close()
+
+        # reports of a program, that failed to load, are written empty, so that they are still valid
+        if interpreter is None:
+            empty = Interpreter(Program(), io.BytesIO(), io.StringIO(), io.StringIO())
+            if profile_file is not None:
+                Profile(empty.program, profile_file, profile_arg.endswith(".json")).write()
+            if flamegraph_file is not None or flamegraph_time_file is not None:
+                CallGraph(empty, flamegraph_file, flamegraph_time_file).write()
+            if sample_file is not None:
+                Sampler(empty, sample_file, sample_interval / 1000).write()
+
+        if metrics_file is not None:
+            with metrics_file:
+                write_metrics(metrics_file, timer, interpreter, exit_code)
+
+
+# writes metrics of the run in OpenMetrics text format, instructions are counted by the interpreter, that was
+# created when the program was loaded
+def write_metrics(file, timer, interpreter, exit_code):
+    instruction_counter = interpreter.instruction_counter if interpreter is not None else 0
+
+    file.write("# TYPE ipp_phase_seconds gauge\n")
+    file.write("# UNIT ipp_phase_seconds seconds\n")
+    file.write("# HELP ipp_phase_seconds Wall time of interpretation phase.\n")
+    for name, seconds in timer.phases.items():
+        file.write('ipp_phase_seconds{phase="%s"} %.9f\n' % (name, seconds))
+
+    file.write("# TYPE ipp_instructions counter\n")
+    file.write("# HELP ipp_instructions Number of executed instructions.\n")
+    file.write("ipp_instructions_total %d\n" % instruction_counter)
+
+    file.write("# TYPE ipp_instructions_per_second gauge\n")
+    file.write("# HELP ipp_instructions_per_second Executed instructions per second of the execution phase.\n")
+    execution = timer.phases.get("execute", 0.0)
+    file.write("ipp_instructions_per_second %.3f\n" % (instruction_counter / execution if execution > 0 else 0.0))
+
+    if resource is not None:
+        # maximum resident set size is in kilobytes on Linux, but in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        file.write("# TYPE ipp_peak_rss_bytes gauge\n")
+        file.write("# UNIT ipp_peak_rss_bytes bytes\n")
+        file.write("# HELP ipp_peak_rss_bytes Peak resident set size of the interpret.\n")
+        file.write("ipp_peak_rss_bytes %d\n" % (peak if sys.platform == "darwin" else peak * 1024))
+
+    file.write("# TYPE ipp_exit_code gauge\n")
+    file.write("# HELP ipp_exit_code Exit code of the interpret.\n")
+    file.write("ipp_exit_code %d\n" % exit_code)
+    file.write("# EOF\n")
+
+
+# opens file for a profiling report, returns None when the report was not requested
+def open_report(path):
+    if path is None: return None
 
+    try:
+        return open(path, 'w')
+    except IOError:
+        error(12)
+
+
+# compiled program, that can be run any number of times by independent interpreters. Code is a flat list
+# of (handler, arguments) records, variables are resolved to slots of frames and literals are parsed
+class Program:
+    def __init__(self):
+        self.code = []
+        self.gf_slots = {}      # names of global variables and their slots in global frame
+        self.local_slots = {}   # names of local and temporary variables and their slots in these frames
+        self.labels = {}
+        self.orders = set()     # orders of loaded instructions
+        self.constants = {}     # constant pool of parsed literals
+        self.misses = {}        # failed guards of quickened instructions by their index
+
+    # translates already checked instruction element into (order, handler, arguments) record
+    def compile_instruction(self, instruction, arguments):
+        handler = INSTRUCTIONS[instruction.attrib['opcode'].upper()][0]
+        arguments = tuple(self.compile_argument(argument) for argument in arguments)
+
+        return (int(instruction.attrib['order']), handler, arguments)
+
+    # translates XML argument into operand. Literals become (CONST, value) with value taken from the constant
+    # pool, variables become (frame, slot) and labels and types are kept as plain strings
+    def compile_argument(self, argument):
+        arg_type = argument.attrib.get("type")
+
+        if arg_type == "var":
+            return self.compile_variable(argument.text)
+        elif arg_type in ("label", "type"):
+            return argument.text
+        else:
+            return (CONST, self.get_constant(arg_type, argument.text))
 
-def check_eqs(instruction):
-    if len(instruction) != 0: exit(32)
+    # resolves variable name to index of its slot in the frame. Local and temporary frames share the slots,
+    # because temporary frame becomes local frame after PUSHFRAME
+    def compile_variable(self, text):
+        if text is None or text[2:3] != "@" or text[0:2] not in FRAMES or text[3:] == "": error(32)
 
-    values = read_stack_values(2)
+        frame = FRAMES[text[0:2]]
+        slots = self.gf_slots if frame == GF else self.local_slots
+        return (frame, slots.setdefault(text[3:], len(slots)))
 
-    if values[0] is None and values[1] is None:
-        data_stack.append(True)
-    elif values[0] is None or values[1] is None:
-        data_stack.append(values[0] == values[1])
-    elif type(values[0]) is type(values[1]):
-        data_stack.append(values[0] == values[1])
-    else:
-        exit(53)
+    # returns parsed value of literal. Every distinct literal is parsed only once and is then shared from the constant pool
+    def get_constant(self, arg_type, text):
+        key = (arg_type, text)
+        if key not in self.constants:
+            self.constants[key] = parse_literal(arg_type, "" if text is None else text)
+        return self.constants[key]
 
 
-def check_ands(instruction):
-    if len(instruction) != 0: exit(32)
+# programs of the batch by their source or exit codes of their loading, shared with forked workers
+batch_programs = {}
 
-    values = read_stack_values(2)
 
-    if type(values[0]) is not bool: exit(53)
+# runs jobs of the batch manifest in a pool of worker processes. Manifest has one JSON object per line with
+# "source" of the program and optional "input" and "id" of the job. Every distinct program is loaded once, before
+# the workers are started, so that forked workers share it. Results are written in order of the manifest, either
+# as JSON lines to standard output, or as files with output of every job and results.jsonl to the output directory
+def run_batch(manifest, jobs, output_directory):
+    import json
 
-    if type(values[1]) is not bool: exit(53)
+    batch = []
+    identifiers = set()
+    try:
+        with open(manifest) as file:
+            for number, line in enumerate(file, 1):
+                if not line.strip(): continue
+
+                job = json.loads(line)
+                if not isinstance(job, dict) or not isinstance(job.get("source"), str): error(11)
+                if not isinstance(job.get("input", ""), str): error(11)
+
+                # id names files of the job in the output directory, so it has to be unique
+                identifier = str(job.get("id", number))
+                if os.path.basename(identifier) != identifier or identifier in ("", ".", ".."): error(11)
+                if identifier in identifiers: error(11)
+                identifiers.add(identifier)
+                batch.append((identifier, job["source"], job.get("input")))
+    except (OSError, ValueError):
+        error(11)
+
+    if output_directory is not None:
+        try:
+            os.makedirs(output_directory, exist_ok=True)
+            results_file = open(os.path.join(output_directory, "results.jsonl"), "w")
+        except OSError:
+            error(12)
 
-    data_stack.append(values[0] and values[1])
+    for identifier, source, input_path in batch:
+        batch_program(source)
 
+    # modules of the batch and server modes and of the scheduler are imported only when they are used, so that
+    # they do not slow down the startup of single runs
+    import multiprocessing
 
-def check_ors(instruction):
-    if len(instruction) != 0: exit(32)
+    # forked workers inherit loaded programs, other platforms load them again in every worker
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
 
-    values = read_stack_values(2)
+    with context.Pool(min(jobs, max(len(batch), 1))) as pool:
+        for result in pool.imap(run_batch_job, batch, chunksize=max(len(batch) // (jobs * 4), 1)):
+            if output_directory is None:
+                sys.stdout.write(json.dumps(result) + "\n")
+                continue
 
-    if type(values[0]) is not bool:
-        exit(53)
-    if type(values[1]) is not bool:
-        exit(53)
+            try:
+                base = os.path.join(output_directory, result["id"])
+                with open(base + ".stdout", "w") as file:
+                    file.write(result.pop("stdout"))
+                with open(base + ".stderr", "w") as file:
+                    file.write(result.pop("stderr"))
+            except OSError:
+                error(12)
+            results_file.write(json.dumps(result) + "\n")
+
+    if output_directory is not None:
+        results_file.close()
+    return 0
+
+
+# returns loaded program of the batch or exit code of its loading error, every program is loaded only once in a process
+def batch_program(source):
+    if source not in batch_programs:
+        try:
+            batch_programs[source] = load_program(source)
+        except InterpretError as interpret_error:
+            batch_programs[source] = interpret_error.code
+    return batch_programs[source]
 
-    data_stack.append(values[0] or values[1])
 
+# runs one job of the batch in a worker process and returns its result with collected outputs
+def run_batch_job(job):
+    identifier, source, input_path = job
+    output = io.StringIO()
+    debug_output = io.StringIO()
 
-def check_nots(instruction):
-    if len(instruction) != 0: exit(32)
+    try:
+        program = batch_program(source)
+        if not isinstance(program, Program): error(program)
 
-    values = read_stack_values(1)
+        try:
+            input_file = open(input_path, "rb") if input_path is not None else io.BytesIO()
+        except OSError:
+            error(11)
 
-    if type(values[0]) is not bool:
-        exit(53)
-    else:
-        data_stack.append(not values[0])
+        input_reader = InputReader(input_file)
+        try:
+            exit_code = Interpreter(program, input_reader, output, debug_output).run()
+        finally:
+            input_reader.close()
+    except InterpretError as interpret_error:
+        exit_code = interpret_error.code
+
+    return {"id": identifier, "source": source, "input": input_path, "exit_code": exit_code,
+            "stdout": output.getvalue(), "stderr": debug_output.getvalue()}
+
+
+# serves requests on the Unix domain socket until the server is interrupted. Every request is one JSON line with
+# XML of the program in "program" or path to it in "source", optional "input" text and "limits" of the run:
+#   timeout     wall time of the run in seconds, 10 by default
+#   memory      address space of the worker process in bytes
+#   output      maximal number of returned characters of stdout and stderr
+# Response is one JSON line with "exit_code", "stdout", "stderr", "stats" of the run and "error", which is
+# "timeout" or "crash", when the run did not finish, or "request" for a malformed request. Every run is isolated
+# in its own forked worker process, at most jobs workers run at once
+def serve(path, jobs, capacity):
+    import socketserver
+    import json
+
+    cache = ProgramCache(capacity)
+    workers = threading.BoundedSemaphore(jobs)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict): raise ValueError("request is not an object")
+                    response = serve_request(request, cache, workers)
+                except (ValueError, TypeError, AttributeError):
+                    response = {"exit_code": None, "error": "request"}
+
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+                self.wfile.flush()
+
+    # only a stale socket of an earlier server is replaced, any other file at the path is kept
+    try:
+        if not stat.S_ISSOCK(os.lstat(path).st_mode): error(12)
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        error(12)
 
+    try:
+        server = socketserver.ThreadingUnixStreamServer(path, Handler)
+    except OSError:
+        error(12)
 
-def check_int2chars(instruction):
-    if len(instruction) != 0: exit(32)
+    # daemon is usually stopped by SIGTERM, which ends it the same way as an interrupt
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    server.daemon_threads = True
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if stat.S_ISSOCK(os.lstat(path).st_mode):
+            os.remove(path)
+    return 0
 
-    values = read_stack_values(1)
 
-    if type(values[0]) is not int:
-        exit(53)
+# returns response to one request of the server
+def serve_request(request, cache, workers):
+    if "program" in request:
+        source = request["program"].encode()
     else:
         try:
-            value = chr(values[0])
-        except:
-            exit(58)
-
-        data_stack.append(decode_string(value))
-
-
-def check_stri2ints(instruction):
-    if len(instruction) != 0: exit(32)
+            with open(request["source"], "rb") as file:
+                source = file.read()
+        except (OSError, KeyError, TypeError):
+            return {"exit_code": 31, "stdout": "", "stderr": "", "stats": None, "error": None}
 
-    values = read_stack_values(2)
+    limits = request.get("limits", {})
+    if not isinstance(limits, dict): raise TypeError("limits are not an object")
+    timeout = request_limit(limits, "timeout", 10, (int, float))
+    memory = request_limit(limits, "memory", None, (int,))
+    output_limit = request_limit(limits, "output", None, (int,))
 
-    if type(values[0]) is not int: exit(53)
-    if type(values[1]) is not str: exit(53)
+    # address space can not be raised above the hard limit of the server
+    if memory and resource is not None:
+        hard = resource.getrlimit(resource.RLIMIT_AS)[1]
+        if hard != resource.RLIM_INFINITY and memory > hard: raise ValueError("memory limit is above the hard limit")
 
+    input_text = request.get("input", "")
+    if not isinstance(input_text, str): raise TypeError("input is not a string")
 
-    str_value = values[1]
-    index_value = values[0]
-    if index_value > len(str_value):
-        exit(58)
     try:
-        value = ord(str_value[index_value])
-    except:
-        exit(58)
+        program = cache.get(source)
+    except InterpretError as interpret_error:
+        return {"exit_code": interpret_error.code, "stdout": "", "stderr": "", "stats": None, "error": None}
 
-    data_stack.append(value)
+    import multiprocessing
 
+    # forked worker inherits the compiled program, so nothing but the result has to be transferred
+    context = multiprocessing.get_context("fork")
+    with workers:
+        receiver, sender = context.Pipe(duplex=False)
+        worker = context.Process(target=serve_run, args=(program, input_text, memory, output_limit, sender), daemon=True)
+        worker.start()
+        sender.close()
 
-def check_jumpifeqs(instruction):
-    if len(instruction) != 1: exit(32)
-
-    values = read_stack_values(2)
-
-    eq = False
-    if values[0] is None and values[1] is None:
-        eq = True
-    elif values[0] is None or values[1] is None:
-        pass
-    elif type(values[0]) is type(values[1]):
-        eq = values[0] == values[1]
-    else:
-        exit(53)
+        response = None
+        try:
+            if receiver.poll(timeout):
+                response = receiver.recv()
+                response.setdefault("error", None)
+            else:
+                response = {"exit_code": None, "stdout": "", "stderr": "", "stats": None, "error": "timeout"}
+        except EOFError:
+            response = {"exit_code": None, "stdout": "", "stderr": "", "stats": None, "error": "crash"}
+        finally:
+            if worker.is_alive():
+                worker.kill()
+            worker.join()
+            receiver.close()
 
-    jump(instruction, eq)
+    return response
 
 
-def check_jumpifneqs(instruction):
-    if len(instruction) != 1: exit(32)
+# returns limit of the request, that has to be a finite non-negative number of one of the kinds
+def request_limit(limits, name, default, kinds):
+    value = limits.get(name, default)
+    if value is None: return None
 
-    values = read_stack_values(2)
+    if type(value) not in kinds or not 0 <= value < float("inf"): raise ValueError("invalid limit " + name)
+    return value
 
-    eq = False
-    if values[0] is None and values[1] is None:
-        exit(53)
-    elif values[0] is None or values[1] is None:
-        pass
-    elif type(values[0]) is type(values[1]):
-        eq = values[0] == values[1]
-    else:
-        exit(53)
 
-    check_jump(instruction, not eq)
+# runs the program in a worker process of the server and sends result of the run through the connection.
+# Memory limit, that the system refuses, is an error of the request
+def serve_run(program, input_text, memory, output_limit, connection):
+    if resource is not None and memory:
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+        except (ValueError, OverflowError, OSError):
+            connection.send({"exit_code": None, "stdout": "", "stderr": "", "stats": None, "error": "request"})
+            connection.close()
+            return
 
+    output = io.StringIO()
+    debug_output = io.StringIO()
+    interpreter = Interpreter(program, io.BytesIO(input_text.encode()), output, debug_output)
 
+    start = time.perf_counter()
+    try:
+        exit_code = interpreter.run()
+    except InterpretError as interpret_error:
+        exit_code = interpret_error.code
+    except MemoryError:
+        exit_code = 99
+    elapsed = time.perf_counter() - start
+
+    connection.send({
+        "exit_code": exit_code,
+        "stdout": output.getvalue()[:output_limit],
+        "stderr": debug_output.getvalue()[:output_limit],
+        "stats": {"insts": interpreter.instruction_counter, "time": elapsed}
+    })
+    connection.close()
+
+
+# reads XML representation of the program as a stream. Every instruction is validated and compiled as soon
+# as its element is parsed and the element is then released, so that the whole tree is never held in memory.
+# Records are sorted by order and linked, so that the execution loop does not have to touch the XML structure,
+# sort arguments or look up opcodes. Phases of loading are measured by the timer, when it is given
+def load_program(source, timer=None):
+    if timer is None:
+        timer = PhaseTimer()
+
+    program = Program()
+    records = []
+    depth = 0
+    structure_error = None      # first error of the structure, raised only when the whole document is well-formed
 
-def check_add(instruction):
-    if len(instruction) != 3: exit(32)
+    try:
+        for event, element in XML.iterparse(source, events=("start", "end")):
+            if event == "start":
+                if depth == 0:
+                    if element.tag != "program": structure_error = XMLStructureError()
+                    root = element
+                depth += 1
+                continue
+
+            depth -= 1
+            if depth == 1:
+                if structure_error is None:
+                    try:
+                        arguments = sorted(element, key=lambda argument: argument.tag)
+                        if not xml_structure_ok(element, arguments, program.orders): error(32)
+
+                        records.append(program.compile_instruction(element, arguments))
+                    except InterpretError as interpret_error:
+                        structure_error = interpret_error
+                root.clear()
+    except (XML.ParseError, OSError):
+        error(31)
+
+    if structure_error is not None:
+        raise structure_error
+
+    timer.end("parse")
+
+    records.sort(key=lambda record: record[0])
+    program.code = [(handler, arguments) for order, handler, arguments in records]
+    timer.end("sort")
+
+    link_program(program)
+    timer.end("link")
+    return program
+
+
+# first pass through to define all labels...
+def link_program(program):
+    code = program.code
+    labels = program.labels
+
+    for index, (handler, arguments) in enumerate(code):
+        if handler is Interpreter.nothing:
+            if arguments[0] in labels: error(52)
+
+            labels[arguments[0]] = index
+
+    # ...and to replace labels of jumps and calls by indexes of their targets, so every undefined
+    # label is found before the execution starts and jumping is just an assignment to pc
+    for index, (handler, arguments) in enumerate(code):
+        if handler is not Interpreter.nothing and INSTRUCTIONS[OPCODES[handler]][1][:1] == ("label",):
+            if arguments[0] not in labels: error(52)
+
+            code[index] = (handler, (labels[arguments[0]],) + arguments[1:])
+
+
+# runs requested optimization passes on the loaded program. Optimized code contains handlers, that are not
+# instructions of IPPcode20, so it can not be stored in the cache
+def optimize_program(program, passes):
+    for name, optimization in OPTIMIZATIONS.items():
+        if name in passes:
+            optimization(program)
+
+
+# replaces common sequences of instructions by fused superinstructions, that save dispatch of every instruction
+# but the first. Superinstruction takes place of the first instruction and skips the rest, that stays in the code,
+# so indexes of instructions do not change and a jump or return into the middle of the sequence executes the
+# original instructions
+def peephole(program):
+    code = program.code
+    optimized = list(code)
+    pushs = Interpreter.check_pushs
+    index = 0
+
+    while index < len(code):
+        handlers = [handler for handler, arguments in code[index:index + 4]]
+        arguments = [arguments for handler, arguments in code[index:index + 4]]
+
+        if handlers[:2] == [pushs, pushs] and len(handlers) > 2:
+            if handlers[2] in BINARY_STACK_HANDLERS and handlers[3:] == [Interpreter.check_pops]:
+                optimized[index] = (Interpreter.fused_stack_operation, (arguments[0][0], arguments[1][0], handlers[2], arguments[3][0]))
+                index += 4
+                continue
+            if handlers[2] in (Interpreter.check_jumpifeqs, Interpreter.check_jumpifneqs):
+                optimized[index] = (Interpreter.fused_stack_jump, (arguments[0][0], arguments[1][0], handlers[2], arguments[2]))
+                index += 3
+                continue
+
+        if tuple(handlers[:2]) in FUSED_PAIRS:
+            optimized[index] = (Interpreter.fused_pair, (handlers[0], arguments[0], handlers[1], arguments[1]))
+            index += 2
+            continue
+        index += 1
+
+    program.code = optimized
+
+
+# optimizes the program by data flow analysis over its control flow graph. Constant operands and copies of
+# variables are propagated to the instructions, that read them, instructions with all operands constant are
+# folded to MOVE of the result and unreachable blocks are removed. Computations, that would end by an error, are
+# kept, so that the error is still raised at run time. No reachable instruction is removed, so the count
+# of executed instructions does not change
+def dataflow(program):
+    code = program.code
+    blocks = basic_blocks(code)
+    facts = solve_flow(code, blocks, propagate, operand_key)
+
+    optimized = []
+    indexes = []        # new index of every kept instruction by its original index
+    for number, (start, end, successors) in enumerate(blocks):
+        if facts[number] is None: continue
+
+        folded = list(code[start:end])
+        propagate(folded, 0, end - start, dict(facts[number]), folded)
+        optimized.extend(folded)
+        indexes.extend(range(start, end))
+
+    # targets of jumps and labels are moved to the new indexes, labels of removed blocks point to the next
+    # kept instruction and still count as defined labels
+    def new_index(index):
+        return bisect.bisect_left(indexes, index)
+
+    for index, (handler, arguments) in enumerate(optimized):
+        if handler is not Interpreter.nothing and INSTRUCTIONS[OPCODES[handler]][1][:1] == ("label",):
+            optimized[index] = (handler, (new_index(arguments[0]),) + arguments[1:])
+    for label, index in program.labels.items():
+        program.labels[label] = new_index(index)
+
+    program.code = optimized
+
+
+# splits the code into basic blocks and returns list of (start, end, indexes of successor blocks). Blocks start at
+# labels and after every instruction, that transfers control. Returns of calls continue after their CALL
+def basic_blocks(code):
+    leaders = {0}
+    for index, (handler, arguments) in enumerate(code):
+        if handler is Interpreter.nothing:
+            leaders.add(index)
+        elif handler in CONTROL_HANDLERS:
+            leaders.add(index + 1)
+
+    starts = sorted(leader for leader in leaders if leader < len(code))
+    blocks = []
+    for start, end in zip(starts, starts[1:] + [len(code)]):
+        handler, arguments = code[end - 1]
+        successors = []
+        if handler in CONTROL_HANDLERS:
+            if handler not in (Interpreter.check_return, Interpreter.check_exit):
+                successors.append(arguments[0])
+            if handler not in (Interpreter.check_jump, Interpreter.check_return, Interpreter.check_exit) and end < len(code):
+                successors.append(end)
+        elif end < len(code):
+            successors.append(end)
+        blocks.append((start, end, successors))
+    return blocks
+
+
+# returns facts about variables on entry of every block, None for unreachable blocks. Transfer returns facts after
+# the block from facts on its entry, facts are met at joins by keeping the facts with the same key in all
+# predecessors, until none of them changes
+def solve_flow(code, blocks, transfer, key):
+    starts = {start: number for number, (start, end, successors) in enumerate(blocks)}
+    facts = [None] * len(blocks)
+    if blocks:
+        facts[0] = {}
+
+    pending = [0] if blocks else []
+    while pending:
+        number = pending.pop()
+        start, end, successors = blocks[number]
+        output = transfer(code, start, end, dict(facts[number]), None)
+
+        for successor in successors:
+            successor = starts[successor]
+            if facts[successor] is None:
+                met = dict(output)
+            else:
+                met = {variable: fact for variable, fact in facts[successor].items()
+                       if variable in output and key(output[variable]) == key(fact)}
+            if facts[successor] is None or met != facts[successor]:
+                facts[successor] = met
+                pending.append(successor)
+    return facts
 
-    if (get_type(instruction[1]) == "int" and get_type(instruction[2]) == "int") or (get_type(instruction[1]) == "float" and get_type(instruction[2]) == "float"):
-        value1 = get_value(instruction[1])
-        value2 = get_value(instruction[2])
-        set_value_to_var(instruction[0], value1 + value2)
-    else:
-        exit(53)
 
+# applies known facts to instructions of the code between start and end and returns facts after them. Facts map
+# variables to constants or to other variables, that hold the same value. When code is rewritten, operands are
+# replaced by known values and pure instructions with constant operands are folded to MOVE
+def propagate(code, start, end, facts, rewritten):
+    for index in range(start, end):
+        handler, arguments = code[index]
+        kinds = INSTRUCTIONS[OPCODES[handler]][1]
 
-def check_sub(instruction):
-    if len(instruction) != 3: exit(32)
+        operands = tuple(facts.get(argument, argument) if kind == "symb" and argument[0] != CONST else argument
+                         for kind, argument in zip(kinds, arguments))
 
-    if (get_type(instruction[1]) == "int" and get_type(instruction[2]) == "int") or (get_type(instruction[1]) == "float" and get_type(instruction[2]) == "float"):
-        value1 = get_value(instruction[1])
-        value2 = get_value(instruction[2])
-        set_value_to_var(instruction[0], value1 - value2)
+        value = None
+        if handler in FOLDABLE_HANDLERS and all(operand[0] == CONST for operand in operands[1:]):
+            value = fold(handler, operands)
+            if value is not None:
+                handler, operands = Interpreter.check_move, (operands[0], value)
+
+        if rewritten is not None:
+            rewritten[index] = (handler, operands)
+
+        if handler in (Interpreter.check_createframe, Interpreter.check_pushframe, Interpreter.check_popframe):
+            forget(facts, lambda variable: variable[0] != GF)
+        elif handler is Interpreter.check_call:
+            facts.clear()
+        elif kinds[:1] == ("var",):
+            target = operands[0]
+            forget(facts, lambda variable: variable == target)
+            if handler is Interpreter.check_move and operands[1] != target:
+                facts[target] = operands[1]
+    return facts
+
+
+# removes facts about variables, for which the condition holds, and facts, that refer to them
+def forget(facts, condition):
+    for variable, operand in list(facts.items()):
+        if condition(variable) or (operand[0] != CONST and condition(operand)):
+            del facts[variable]
+
+
+# returns constant operand with result of the pure instruction or None, when the instruction would end by an error
+# or the result is too large to be kept in the code. The instruction is executed by its own handler, so that
+# the folded result is exactly the result of the run
+def fold(handler, operands):
+    interpreter = Interpreter(Program(), io.BytesIO(), io.StringIO(), io.StringIO())
+    interpreter.gf = [UNINITIALIZED]
+    try:
+        handler(interpreter, ((GF, 0),) + operands[1:])
+    except InterpretError:
+        return None
+
+    value = interpreter.gf[0]
+    if (type(value) is int and value.bit_length() > FOLD_LIMIT) or (type(value) is str and len(value) > FOLD_LIMIT):
+        return None
+    return (CONST, value)
+
+
+# selects handlers without type checks for instructions, whose operands have types proven by data flow analysis.
+# Type of a variable is known after it was written by an instruction with known type of result, or after it was
+# read by an instruction, that succeeds only for one type of the operand. Instructions with unknown types keep
+# their fully checked handlers
+def infer_types(program):
+    code = program.code
+    blocks = basic_blocks(code)
+    facts = solve_flow(code, blocks, propagate_types, lambda name: name)
+
+    optimized = list(code)
+    for number, (start, end, successors) in enumerate(blocks):
+        if facts[number] is not None:
+            propagate_types(code, start, end, dict(facts[number]), optimized)
+    program.code = optimized
+
+
+# applies known types of variables to instructions of the code between start and end and returns types after
+# them. When code is rewritten, instructions with proven types of operands get their typed handlers
+def propagate_types(code, start, end, types, rewritten):
+    for index in range(start, end):
+        handler, arguments = code[index]
+        kinds = INSTRUCTIONS[OPCODES[handler]][1]
+        symbols = [argument for kind, argument in zip(kinds, arguments) if kind == "symb"]
+        known = tuple(TYPE_NAMES[type(symbol[1])] if symbol[0] == CONST else types.get(symbol) for symbol in symbols)
+
+        if rewritten is not None and (handler,) + known in TYPED_HANDLERS:
+            rewritten[index] = (TYPED_HANDLERS[(handler,) + known], arguments)
+
+        if handler in (Interpreter.check_createframe, Interpreter.check_pushframe, Interpreter.check_popframe):
+            forget(types, lambda variable: variable[0] != GF)
+            continue
+        elif handler is Interpreter.check_call:
+            types.clear()
+            continue
+
+        # instruction, that succeeded, proves types of its operands
+        required = OPERAND_TYPES.get(handler)
+        if handler in (Interpreter.check_add, Interpreter.check_sub, Interpreter.check_mul):
+            required = (known[0] or known[1],) * 2
+        for symbol, name in zip(symbols, required or ()):
+            if symbol[0] != CONST and name is not None:
+                types[symbol] = name
+
+        if kinds[:1] == ("var",):
+            target = arguments[0]
+            types.pop(target, None)
+            if handler is Interpreter.check_move:
+                name = known[0]
+            elif handler in (Interpreter.check_add, Interpreter.check_sub, Interpreter.check_mul):
+                name = known[0] or known[1]
+            else:
+                name = RESULT_TYPES.get(handler)
+            if name is not None:
+                types[target] = name
+    return types
+
+
+# replaces instructions, that can be specialized by types of their operands, by adaptive instructions, that
+# specialize themselves, when they are executed. Code of the program is shared by its interpreters, so the
+# instruction is specialized by the types, that the first interpreter saw, and guards keep it correct for others
+def quicken(program):
+    program.code = [(Interpreter.adaptive, (handler, arguments)) if handler in QUICKENING_HANDLERS else (handler, arguments)
+                    for handler, arguments in program.code]
+
+
+# returns handler specialized for operands of the given types, that stores result of the operation to the
+# variable. Operands are read in the same order as by the generic handler, so errors stay the same, and
+# the instruction is de-specialized, when the guard of types fails
+def quickened_store(generic, operation, first, second):
+    def handler(self, instruction):
+        value1 = self.get_value(instruction[1])
+        if type(value1) is first:
+            value2 = self.get_value(instruction[2])
+            if type(value2) is second:
+                self.set_value_to_var(instruction[0], operation(value1, value2))
+                return
+        self.deoptimize(generic, instruction)
+    return handler
+
+
+# returns handler specialized for operands of the given types, that jumps, when the condition holds
+def quickened_jump(generic, condition, first, second):
+    def handler(self, instruction):
+        value1 = self.get_value(instruction[1])
+        if type(value1) is first:
+            value2 = self.get_value(instruction[2])
+            if type(value2) is second:
+                self.jump(instruction, condition(value1, value2))
+                return
+        self.deoptimize(generic, instruction)
+    return handler
+
+
+# key of operand, that tells apart equal values of different types and floats, that are written differently
+def operand_key(operand):
+    return operand[0], type(operand[1]), repr(operand[1])
+
+
+# returns source of the program and path to its file in the cache directory. The file is named by hash of the
+# program and of the interpret itself, so that a change of either of them never reuses a stale entry.
+# Program given on standard input has to be kept in memory, because it is read twice
+def open_cache(source, directory):
+    import hashlib
+
+    digest = hashlib.sha256()
+    with open(__file__, "rb") as file:
+        digest.update(file.read())
+
+    if isinstance(source, str):
+        try:
+            with open(source, "rb") as file:
+                for chunk in iter(lambda: file.read(1 << 16), b""):
+                    digest.update(chunk)
+        except OSError:
+            error(31)
     else:
-        exit(53)
+        source = io.BytesIO(source.read())
+        digest.update(source.getvalue())
 
+    return source, os.path.join(directory, digest.hexdigest() + ".ippc")
 
 
-def check_mul(instruction):
-    if len(instruction) != 3: exit(32)
-
-    if (get_type(instruction[1]) == "int" and get_type(instruction[2]) == "int") or (get_type(instruction[1]) == "float" and get_type(instruction[2]) == "float"):
-        value1 = get_value(instruction[1])
-        value2 = get_value(instruction[2])
-        set_value_to_var(instruction[0], value1 * value2)
-    else:
-        exit(53)
+# restores compiled program, slots of variables and labels from the cache file. Returns None, when the file
+# does not exist or is corrupted, so that the program is compiled again
+def read_cache(path):
+    import hashlib
 
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+    except OSError:
+        return None
 
-def check_div(instruction):
-    if len(instruction) != 3: exit(32)
+    header = len(CACHE_MAGIC)
+    payload = data[header + 32:]
+    if data[:header] != CACHE_MAGIC or data[header:header + 32] != hashlib.sha256(payload).digest():
+        return None
 
-    if get_type(instruction[1]) != "float" or get_type(instruction[2]) != "float":
-        exit(53)
-    else:
-        value1 = get_value(instruction[1])
-        value2 = get_value(instruction[2])
-        if value2 == 0.0:
-            exit(57)
-        else:
-            set_value_to_var(instruction[0], value1 / value2)
+    program = Program()
+    try:
+        opcodes, arguments, gf_names, local_names, label_table, order_list = marshal.loads(payload)
+        program.code = [(INSTRUCTIONS[opcode][0], tuple(operands)) for opcode, operands in zip(opcodes, arguments)]
+        if len(program.code) != len(arguments): return None
+    except (ValueError, EOFError, TypeError, KeyError):
+        return None
+
+    program.gf_slots.update((name, slot) for slot, name in enumerate(gf_names))
+    program.local_slots.update((name, slot) for slot, name in enumerate(local_names))
+    program.labels.update(label_table)
+    program.orders.update(order_list)
+    return program
+
+
+# returns compiled program in the marshalled form stored in the cache
+def program_payload(program):
+    return marshal.dumps((
+        [OPCODES[handler] for handler, arguments in program.code],
+        [arguments for handler, arguments in program.code],
+        list(program.gf_slots),
+        list(program.local_slots),
+        program.labels,
+        sorted(program.orders)
+    ))
+
+
+# stores compiled program to the cache file. The file is replaced atomically, so that concurrent runs never
+# read a partially written entry. Failure to write the cache is not an error of the interpretation
+def write_cache(path, program):
+    import tempfile
+    import hashlib
+
+    payload = program_payload(program)
 
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(file, "wb") as file:
+                file.write(CACHE_MAGIC + hashlib.sha256(payload).digest() + payload)
+            os.replace(temporary, path)
+        except OSError:
+            os.remove(temporary)
+    except OSError:
+        pass
 
-def check_idiv(instruction):
-    if len(instruction) != 3: exit(32)
 
-    if get_type(instruction[1]) != "int" or get_type(instruction[2]) != "int":
-        exit(53)
-    else:
-        value1 = get_value(instruction[1])
-        value2 = get_value(instruction[2])
-        if(value2 == 0):
-            exit(57)
+# parses and validates literal of given type, malformed literal is an error in XML structure
+def parse_literal(arg_type, text):
+    try:
+        if arg_type == "nil":
+            if text != "nil": error(32)
+            return None
+        elif arg_type == "bool":
+            if text not in ("true", "false"): error(32)
+            return text == "true"
+        elif arg_type == "int":
+            return int(text)
+        elif arg_type == "float":
+            return float.fromhex(text)
         else:
-            set_value_to_var(instruction[0], value1 // value2)
-
+            return decode_string(text)
+    except ValueError:
+        error(32)
+
+
+# interpreter of a compiled program. All state of the execution is kept in the instance, so that a loaded
+# program can be run repeatedly and several interpreters can run next to each other. Input is a binary or
+# text stream with one value per line or an InputReader, outputs are text streams, standard streams are used by default
+class Interpreter:
+    def __init__(self, program, input=None, output=None, debug_output=None, line_buffered=False):
+        self.program = program
+        self.code = program.code
+        self.gf_slots = program.gf_slots
+        self.local_slots = program.local_slots
+        self.labels = program.labels
+
+        self.gf = [UNDECLARED] * len(program.gf_slots)     # Global Frame with slot of every global variable
+        self.lf = []        # Local Frame initialization
+        self.tf = None      # Temporary Frame does not exist until CREATEFRAME
+
+        self.pc = 0         # Program counter
+        self.pc_stack = []
+        self.data_stack = []
+
+        # labels were counted in the first pass, when the program was linked
+        self.instruction_counter = len(program.labels)
+
+        if isinstance(input, InputReader):
+            self.input_reader = input
+        else:
+            self.input_reader = InputReader(sys.stdin.buffer if input is None else input)
+        self.output = OutputBuffer(sys.stdout if output is None else output, line_buffered)
+        self.debug_output = OutputBuffer(sys.stderr if debug_output is None else debug_output, line_buffered=True)
 
-def check_lt(instruction):
-    if len(instruction) != 3: exit(32)
+    # runs the program and returns its exit code, 0 or value of EXIT instruction. Errors of the interpretation are
+    # raised as InterpretError. Output is flushed on every way out
+    def run(self, profilers=()):
+        try:
+            if profilers:
+                self.execute_profiled(profilers)
+            else:
+                self.execute()
+        except ProgramExit as program_exit:
+            return program_exit.code
+        finally:
+            self.output.flush()
+            self.debug_output.flush()
+        return 0
+
+    def execute(self):
+        code = self.code
+
+        while self.pc < len(code):
+            handler, arguments = code[self.pc]
+            handler(self, arguments)
+            self.instruction_counter += 1
+            self.pc += 1
+
+    # executes at most quantum instructions and returns, whether the program reached its end
+    def execute_quantum(self, quantum):
+        code = self.code
+
+        for _ in range(quantum):
+            if self.pc >= len(code): return True
+            handler, arguments = code[self.pc]
+            handler(self, arguments)
+            self.instruction_counter += 1
+            self.pc += 1
+        return self.pc >= len(code)
+
+    # same as execute, but measures every executed instruction and passes its index and wall time to the profilers.
+    # Kept separate, so that the profiling costs nothing when it is not requested
+    def execute_profiled(self, profilers):
+        code = self.code
+        clock = time.perf_counter
 
-    if get_type(instruction[1]) != get_type(instruction[2]) or get_type(instruction[1]) == "nil" or get_type(instruction[2]) == "nil":
-        exit(53)
-    else:
-        value1 = get_value(instruction[1])
-        value2 = get_value(instruction[2])
-        set_value_to_var(instruction[0], value1 < value2)
+        try:
+            while self.pc < len(code):
+                index = self.pc
+                handler, arguments = code[index]
+                start = clock()
+                handler(self, arguments)
+                elapsed = clock() - start
+                for profiler in profilers:
+                    profiler.record(index, elapsed)
+                self.instruction_counter += 1
+                self.pc += 1
+        except BaseException:
+            # instruction, that ended the program by an error or by EXIT, is part of the profiles too
+            elapsed = clock() - start
+            for profiler in profilers:
+                profiler.record(index, elapsed)
+            raise
+
+    def nothing(self, instruction):
+        pass
 
+    def check_move(self, instruction):
+        value = self.get_value(instruction[1])
+        self.set_value_to_var(instruction[0], value)
 
-def check_gt(instruction):
-    if len(instruction) != 3: exit(32)
+    def check_createframe(self, instruction):
+        self.tf = [UNDECLARED] * len(self.local_slots)
 
-    if get_type(instruction[1]) != get_type(instruction[2]) or get_type(instruction[1]) == "nil" or get_type(instruction[2]) == "nil":
-        exit(53)
-    else:
-        value1 = get_value(instruction[1])
-        value2 = get_value(instruction[2])
-        set_value_to_var(instruction[0], value1 > value2)
-
-
-def check_eq(instruction):
-    if len(instruction) != 3: exit(32)
-
-    if get_type(instruction[1]) == "nil" and get_type(instruction[2]) == "nil":
-        set_value_to_var(instruction[0], True)
-    elif get_type(instruction[1]) == "nil" or get_type(instruction[2]) == "nil":
-        value1 = get_value(instruction[1])
-        value2 = get_value(instruction[2])
-        set_value_to_var(instruction[0], value1 == value2)
-    elif get_type(instruction[1]) == get_type(instruction[2]):
-        value1 = get_value(instruction[1])
-        value2 = get_value(instruction[2])
-        set_value_to_var(instruction[0], value1 == value2)
-    else:
-        exit(53)
+    def check_pushframe(self, instruction):
+        if self.tf is None:
+            error(55)
+        else:
+            self.lf.append(self.tf)
+            self.tf = None
 
-def check_and(instruction):
-    if len(instruction) != 3: exit(32)
-    if get_type(instruction[1]) != "bool": exit(53)
-    if get_type(instruction[2]) != "bool": exit(53)
+    def check_popframe(self, instruction):
+        if stack_empty(self.lf):
+            error(55)
+        else:
+            self.tf = self.lf.pop()
 
-    value1 = get_value(instruction[1])
-    value2 = get_value(instruction[2])
-    set_value_to_var(instruction[0], value1 and value2)
+    def check_defvar(self, instruction):
+        self.set_value_to_var(instruction[0], UNINITIALIZED, "defvar")
 
+    def check_call(self, instruction):
+        self.pc_stack.append(self.pc)
+        self.jump(instruction)
 
-def check_or(instruction):
-    if len(instruction) != 3: exit(32)
-    if get_type(instruction[1]) != "bool": exit(53)
-    if get_type(instruction[2]) != "bool": exit(53)
+    def check_return(self, instruction):
+        if stack_empty(self.pc_stack):
+            error(56)
+        else:
+            self.pc = self.pc_stack.pop()
 
-    value1 = get_value(instruction[1])
-    value2 = get_value(instruction[2])
-    set_value_to_var(instruction[0], value1 or value2)
+    def check_pushs(self, instruction):
+        value = self.get_value(instruction[0])
+        self.data_stack.append(value)
 
+    def check_pops(self, instruction):
+        if stack_empty(self.data_stack):
+            error(56)
+        else:
+            value = self.data_stack.pop()
+            self.set_value_to_var(instruction[0], value)
 
-def check_not(instruction):
-    if len(instruction) != 2: exit(32)
+    def check_clears(self, instruction):
+        self.data_stack = []
 
-    if get_type(instruction[1]) != "bool": exit(53)
+    def check_adds(self, instruction):
+        values = self.read_stack_values(2)
 
-    value = get_value(instruction[1])
-    set_value_to_var(instruction[0], not value)
+        if type(values[0]) is int and type(values[1]) is int:
+            self.data_stack.append(values[0] + values[1])
+        else:
+            error(53)
 
+    def check_subs(self, instruction):
+        values = self.read_stack_values(2)
 
-def check_int2char(instruction):
-    if len(instruction) != 2: exit(32)
+        if type(values[0]) is int and type(values[1]) is int:
+            self.data_stack.append(values[1] - values[0])
+        else:
+            error(53)
 
-    value = get_value(instruction[1])
-    if type(value) is not int: exit(53)
-    if value is None: exit(53)
+    def check_muls(self, instruction):
+        values = self.read_stack_values(2)
 
-    try:
-        chr(value)
-    except:
-        exit(58)
-    set_value_to_var(instruction[0], chr(value))
+        if type(values[0]) is int and type(values[1]) is int:
+            self.data_stack.append(values[0] * values[1])
+        else:
+            error(53)
 
+    def check_idivs(self, instruction):
+        values = self.read_stack_values(2)
 
-def check_stri2int(instruction):
-    if len(instruction) != 3: exit(32)
-    if get_type(instruction[1]) != "string": exit(53)
-    if get_type(instruction[2]) != "int": exit(53)
+        if type(values[0]) is int and type(values[1]) is int:
+            if values[0] == 0:
+                error(57)
+            else:
+                self.data_stack.append(values[1] // values[0])
+        else:
+            error(53)
 
-    str_value = get_value(instruction[1])
-    index_value = get_value(instruction[2])
+    def check_lts(self, instruction):
+        values = self.read_stack_values(2)
 
-    if index_value > len(str_value): exit(58)
-    if index_value < 0: exit(58)
-    try:
-        value = ord(str_value[index_value])
-    except:
-        exit(58)
-    set_value_to_var(instruction[0], value)
+        if type(values[0]) is not type(values[1]) or values[0] is None or values[1] is None:
+            error(53)
+        else:
+            self.data_stack.append(values[1] < values[0])
 
+    def check_gts(self, instruction):
+        values = self.read_stack_values(2)
 
-def check_int2float(instruction):
-    if len(instruction) != 2: exit(32)
+        if type(values[0]) is not type(values[1]) or values[0] is None or values[1] is None:
+            error(53)
+        else:
+            self.data_stack.append(values[1] > values[0])
 
-    if get_type(instruction[1]) != "int":
-        exit(53)
-    else:
-        try:
-            value = float(get_value(instruction[1]))
-        except:
-            exit(58)
-        set_value_to_var(instruction[0], value)
+    def check_eqs(self, instruction):
+        values = self.read_stack_values(2)
 
+        if values[0] is None and values[1] is None:
+            self.data_stack.append(True)
+        elif values[0] is None or values[1] is None:
+            self.data_stack.append(values[0] == values[1])
+        elif type(values[0]) is type(values[1]):
+            self.data_stack.append(values[0] == values[1])
+        else:
+            error(53)
 
-def check_float2int(instruction):
-    if len(instruction) != 2: exit(32)
+    def check_ands(self, instruction):
+        values = self.read_stack_values(2)
 
-    if get_type(instruction[1]) != "float":
-        exit(53)
-    else:
-        try:
-            value = int(get_value(instruction[1]))
-        except:
-            exit(58)
-        set_value_to_var(instruction[0], value)
+        if type(values[0]) is not bool: error(53)
 
+        if type(values[1]) is not bool: error(53)
 
-def check_read(instruction):
-    if len(instruction) != 2: exit(32)
+        self.data_stack.append(values[0] and values[1])
 
-    type = instruction[1].text
+    def check_ors(self, instruction):
+        values = self.read_stack_values(2)
 
-    global input_arg
-    if input_arg != sys.stdin:
-        read = file_read()
-    else:
-        try:
-            read = input()
-        except:
-            read = ""
+        if type(values[0]) is not bool:
+            error(53)
+        if type(values[1]) is not bool:
+            error(53)
 
-    read = read.rstrip()
+        self.data_stack.append(values[0] or values[1])
 
-    if read == "":
-        value = ""
+    def check_nots(self, instruction):
+        values = self.read_stack_values(1)
 
-    if type == "bool":
-        if read.lower() == "true":
-            value = True
+        if type(values[0]) is not bool:
+            error(53)
         else:
-            value = False
-    elif type == "int":
-        try:
-            value = int(read)
-        except ValueError:
-            value = None
-    elif type == "float":
-        try:
-            value = float.fromhex(read)
-        except:
-            value = ""
-    elif type == "string":
-        value = read
-    else:
-        exit(53)
+            self.data_stack.append(not values[0])
 
-    set_value_to_var(instruction[0], value)
+    def check_int2chars(self, instruction):
+        values = self.read_stack_values(1)
 
-def check_write(instruction):
-    if len(instruction) != 1: exit(32)
-
-    value = get_value(instruction[0])
-    if value == None:
-        print("", end = '')
+        if type(values[0]) is not int:
+            error(53)
+        else:
+            try:
+                value = chr(values[0])
+            except:
+                error(58)
 
-    elif type(value) is bool:
-        if value == True:
-            print("true", end = '')
-        elif value == False:
-            print("false", end = '')
-    elif type(value) is float:
-        print(float.hex(value), end = '')
-    else:
-        print(value, end = '')
+            self.data_stack.append(value)
 
+    def check_stri2ints(self, instruction):
+        values = self.read_stack_values(2)
 
-def check_concat(instruction):
-    if len(instruction) != 3: exit(32)
-    if get_type(instruction[1]) != "string": exit(53)
-    if get_type(instruction[2]) != "string": exit(53)
+        if type(values[0]) is not int: error(53)
+        if type(values[1]) is not str: error(53)
 
-    value1 = get_value(instruction[1])
-    value2 = get_value(instruction[2])
-    set_value_to_var(instruction[0], value1 + value2)
 
+        str_value = values[1]
+        index_value = values[0]
+        if index_value > len(str_value):
+            error(58)
+        try:
+            value = ord(str_value[index_value])
+        except:
+            error(58)
 
-def check_strlen(instruction):
-    if len(instruction) != 2: exit(32)
+        self.data_stack.append(value)
 
-    if get_type(instruction[1]) != "string":
-        exit(53)
-    else:
-        value = get_value(instruction[1])
-        set_value_to_var(instruction[0], len(value))
+    def check_jumpifeqs(self, instruction):
+        values = self.read_stack_values(2)
 
+        eq = False
+        if values[0] is None and values[1] is None:
+            eq = True
+        elif values[0] is None or values[1] is None:
+            pass
+        elif type(values[0]) is type(values[1]):
+            eq = values[0] == values[1]
+        else:
+            error(53)
 
-def check_getchar(instruction):
-    if len(instruction) != 3: exit(32)
+        self.jump(instruction, eq)
 
-    if get_type(instruction[1]) != "string": exit(53)
-    if get_type(instruction[2]) != "int": exit(53)
+    def check_jumpifneqs(self, instruction):
+        values = self.read_stack_values(2)
 
-    value = get_value(instruction[1])
-    index = get_value(instruction[2])
-    if 0 <= index < len(value):
-        set_value_to_var(instruction[0], value[index])
-    else:
-        exit(58)
+        eq = False
+        if values[0] is None and values[1] is None:
+            error(53)
+        elif values[0] is None or values[1] is None:
+            pass
+        elif type(values[0]) is type(values[1]):
+            eq = values[0] == values[1]
+        else:
+            error(53)
 
+        self.jump(instruction, not eq)
 
-def check_setchar(instruction):
-    if len(instruction) != 3: exit(32)
+    def check_add(self, instruction):
+        if (self.get_type(instruction[1]) == "int" and self.get_type(instruction[2]) == "int") or (self.get_type(instruction[1]) == "float" and self.get_type(instruction[2]) == "float"):
+            value1 = self.get_value(instruction[1])
+            value2 = self.get_value(instruction[2])
+            self.set_value_to_var(instruction[0], value1 + value2)
+        else:
+            error(53)
 
-    if get_type(instruction[0]) != "string": exit(53)
-    if get_type(instruction[1]) != "int": exit(53)
-    if get_type(instruction[2]) != "string": exit(53)
+    def check_sub(self, instruction):
+        if (self.get_type(instruction[1]) == "int" and self.get_type(instruction[2]) == "int") or (self.get_type(instruction[1]) == "float" and self.get_type(instruction[2]) == "float"):
+            value1 = self.get_value(instruction[1])
+            value2 = self.get_value(instruction[2])
+            self.set_value_to_var(instruction[0], value1 - value2)
+        else:
+            error(53)
 
-    value = get_value(instruction[0])
-    index = get_value(instruction[1])
-    character = get_value(instruction[2])
+    def check_mul(self, instruction):
+        if (self.get_type(instruction[1]) == "int" and self.get_type(instruction[2]) == "int") or (self.get_type(instruction[1]) == "float" and self.get_type(instruction[2]) == "float"):
+            value1 = self.get_value(instruction[1])
+            value2 = self.get_value(instruction[2])
+            self.set_value_to_var(instruction[0], value1 * value2)
+        else:
+            error(53)
 
-    try:
-        if 0 <= index < len(value):
-            output = list(value)
-            output[index] = character[0]
-            set_value_to_var(instruction[0], "".join(output))
+    def check_div(self, instruction):
+        if self.get_type(instruction[1]) != "float" or self.get_type(instruction[2]) != "float":
+            error(53)
         else:
-            exit(58)
-    except:
-        exit(58)
-
-
-def check_type(instruction):
-    if len(instruction) != 2: exit(32)
-
-    argument = instruction[1]
-    value = None
-
-    if argument.attrib["type"] == "nil":
-        set_value_to_var(instruction[0], "nil")
-        return
-    elif argument.attrib["type"] == "bool":
-        set_value_to_var(instruction[0], "bool")
-        return
-    elif argument.attrib["type"] == "int":
-        set_value_to_var(instruction[0], "int")
-        return
-    elif argument.attrib["type"] == "float":
-        set_value_to_var(instruction[0], "float")
-        return
-    elif argument.attrib["type"] == "string":
-        set_value_to_var(instruction[0], "string")
-        return
-    elif argument.attrib["type"] == "var":
-
-        frame = argument.text[0:2]
-        name = argument.text[3:]
-
-        if frame == "GF":
-            if name in gf:
-                value = gf[name]
+            value1 = self.get_value(instruction[1])
+            value2 = self.get_value(instruction[2])
+            if value2 == 0.0:
+                error(57)
             else:
-                exit(54)
-        elif frame == "LF":
-            if not stack_empty(lf):  # Stack of local frames is not empty
-                if name in lf[TOP]:
-                    value = lf[TOP][name]
-                else:
-                    exit(54)
-            else:
-                exit(55)
+                self.set_value_to_var(instruction[0], value1 / value2)
 
-        elif frame == "TF":
-            try:
-                if name in tf:
-                    value = tf[name]
-                else:
-                    exit(54)
-            except NameError:
-                exit(55)
+    def check_idiv(self, instruction):
+        if self.get_type(instruction[1]) != "int" or self.get_type(instruction[2]) != "int":
+            error(53)
         else:
-            exit(31)
-    else:
-        exit(31)
-
-
-        output = ""
-    if type(value) is bool:
-        output = "bool"
-    elif type(value) is int:
-        output = "int"
-    elif type(value) is float:
-        output = "float"
-    elif type(value) is str:
-        output = "string"
-    elif value is None:
-        output = ""
-
-    set_value_to_var(instruction[0], output)
-
-
-def check_label(instruction):
-    if len(instruction) != 1: exit(32)
+            value1 = self.get_value(instruction[1])
+            value2 = self.get_value(instruction[2])
+            if(value2 == 0):
+                error(57)
+            else:
+                self.set_value_to_var(instruction[0], value1 // value2)
 
-    if instruction[0].text in labels:
-        exit(52)
-    else:
-        labels[instruction[0].text] = pc
+    def check_lt(self, instruction):
+        if self.get_type(instruction[1]) != self.get_type(instruction[2]) or self.get_type(instruction[1]) == "nil" or self.get_type(instruction[2]) == "nil":
+            error(53)
+        else:
+            value1 = self.get_value(instruction[1])
+            value2 = self.get_value(instruction[2])
+            self.set_value_to_var(instruction[0], value1 < value2)
 
+    def check_gt(self, instruction):
+        if self.get_type(instruction[1]) != self.get_type(instruction[2]) or self.get_type(instruction[1]) == "nil" or self.get_type(instruction[2]) == "nil":
+            error(53)
+        else:
+            value1 = self.get_value(instruction[1])
+            value2 = self.get_value(instruction[2])
+            self.set_value_to_var(instruction[0], value1 > value2)
+
+    def check_eq(self, instruction):
+        if self.get_type(instruction[1]) == "nil" and self.get_type(instruction[2]) == "nil":
+            self.set_value_to_var(instruction[0], True)
+        elif self.get_type(instruction[1]) == "nil" or self.get_type(instruction[2]) == "nil":
+            value1 = self.get_value(instruction[1])
+            value2 = self.get_value(instruction[2])
+            self.set_value_to_var(instruction[0], value1 == value2)
+        elif self.get_type(instruction[1]) == self.get_type(instruction[2]):
+            value1 = self.get_value(instruction[1])
+            value2 = self.get_value(instruction[2])
+            self.set_value_to_var(instruction[0], value1 == value2)
+        else:
+            error(53)
 
-def check_jump(instruction):
-    if len(instruction) != 1:
-        exit(32)
-    else:
-        jump(instruction)
+    def check_and(self, instruction):
+        if self.get_type(instruction[1]) != "bool": error(53)
+        if self.get_type(instruction[2]) != "bool": error(53)
 
+        value1 = self.get_value(instruction[1])
+        value2 = self.get_value(instruction[2])
+        self.set_value_to_var(instruction[0], value1 and value2)
 
+    def check_or(self, instruction):
+        if self.get_type(instruction[1]) != "bool": error(53)
+        if self.get_type(instruction[2]) != "bool": error(53)
 
-def check_jumpifeq(instruction):
-    if len(instruction) != 3: exit(32)
+        value1 = self.get_value(instruction[1])
+        value2 = self.get_value(instruction[2])
+        self.set_value_to_var(instruction[0], value1 or value2)
 
-    eq = False
-    if get_type(instruction[1]) == "nil" and get_type(instruction[2]) == "nil":
-        eq = True
-    elif get_type(instruction[1]) == "nil" or get_type(instruction[2]) == "nil":
-        pass
-    elif get_type(instruction[1]) == get_type(instruction[2]):
-        value1 = get_value(instruction[1])
-        value2 = get_value(instruction[2])
-        eq = value1 == value2
-    else:
-        exit(53)
+    def check_not(self, instruction):
+        if self.get_type(instruction[1]) != "bool": error(53)
 
-    jump(instruction, eq)
+        value = self.get_value(instruction[1])
+        self.set_value_to_var(instruction[0], not value)
 
+    def check_int2char(self, instruction):
+        value = self.get_value(instruction[1])
+        if type(value) is not int: error(53)
+        if value is None: error(53)
 
+        try:
+            chr(value)
+        except:
+            error(58)
+        self.set_value_to_var(instruction[0], chr(value))
 
-def check_jumpifneq(instruction):
-    if len(instruction) != 3: exit(32)
+    def check_stri2int(self, instruction):
+        if self.get_type(instruction[1]) != "string": error(53)
+        if self.get_type(instruction[2]) != "int": error(53)
 
-    eq = False
-    if get_type(instruction[1]) == "nil" and get_type(instruction[2]) == "nil":
-        eq = True
-    elif get_type(instruction[1]) == "nil" or get_type(instruction[2]) == "nil":
-        pass
-    elif get_type(instruction[1]) == get_type(instruction[2]):
-        value1 = get_value(instruction[1])
-        value2 = get_value(instruction[2])
-        eq = value1 == value2
-    else:
-        exit(53)
+        str_value = self.get_value(instruction[1])
+        index_value = self.get_value(instruction[2])
 
-    jump(instruction, not eq)
+        if index_value > len(str_value): error(58)
+        if index_value < 0: error(58)
+        try:
+            value = ord(str_value[index_value])
+        except:
+            error(58)
+        self.set_value_to_var(instruction[0], value)
 
+    def check_int2float(self, instruction):
+        if self.get_type(instruction[1]) != "int":
+            error(53)
+        else:
+            try:
+                value = float(self.get_value(instruction[1]))
+            except:
+                error(58)
+            self.set_value_to_var(instruction[0], value)
+
+    def check_float2int(self, instruction):
+        if self.get_type(instruction[1]) != "float":
+            error(53)
+        else:
+            try:
+                value = int(self.get_value(instruction[1]))
+            except:
+                error(58)
+            self.set_value_to_var(instruction[0], value)
+
+    def check_read(self, instruction):
+        value = self.input_reader.read(instruction[1])
+        self.set_value_to_var(instruction[0], value)
+
+    def check_write(self, instruction):
+        value = self.get_value(instruction[0])
+        self.output.write(WRITE_FORMATS[type(value)](value))
+
+    def check_concat(self, instruction):
+        if self.get_type(instruction[1]) != "string": error(53)
+        if self.get_type(instruction[2]) != "string": error(53)
+
+        value1 = self.get_value(instruction[1])
+        value2 = self.get_value(instruction[2])
+        self.set_value_to_var(instruction[0], value1 + value2)
+
+    def check_strlen(self, instruction):
+        if self.get_type(instruction[1]) != "string":
+            error(53)
+        else:
+            value = self.get_value(instruction[1])
+            self.set_value_to_var(instruction[0], len(value))
 
-def check_exit(instruction):
-    if len(instruction) != 1: exit(32)
-    value = get_value(instruction[0])
-    if (type(value) is not int): exit(53)
-    if not (0 <= value <= 49):
-        exit(57)
-    else:
-        exit(value)
+    def check_getchar(self, instruction):
+        if self.get_type(instruction[1]) != "string": error(53)
+        if self.get_type(instruction[2]) != "int": error(53)
 
+        value = self.get_value(instruction[1])
+        index = self.get_value(instruction[2])
+        if 0 <= index < len(value):
+            self.set_value_to_var(instruction[0], value[index])
+        else:
+            error(58)
 
-def check_dprint(instruction):
-    if len(instruction) != 1: exit(32)
+    def check_setchar(self, instruction):
+        if self.get_type(instruction[0]) != "string": error(53)
+        if self.get_type(instruction[1]) != "int": error(53)
+        if self.get_type(instruction[2]) != "string": error(53)
 
-    value = get_value(instruction[0])
-    print(value, end = '', file=sys.stderr)
+        value = self.get_value(instruction[0])
+        index = self.get_value(instruction[1])
+        character = self.get_value(instruction[2])
 
+        try:
+            if 0 <= index < len(value):
+                output = list(value)
+                output[index] = character[0]
+                self.set_value_to_var(instruction[0], "".join(output))
+            else:
+                error(58)
+        except:
+            error(58)
 
-def check_break(instruction):
-    if len(instruction) != 0: exit(32)
+    def check_type(self, instruction):
+        kind, value = instruction[1]
 
-    stderrprint("\n\n==================== STATS ====================")
-    stderrprint("instruction_counter: " + str(instruction_counter))
+        if kind != CONST:
+            # uninitialized variable has an empty type instead of an error
+            frame, slot = instruction[1]
+            value = self.get_frame(frame)[slot]
+            if value is UNDECLARED: error(54)
 
-    stderrprint("\nPC: " + str(pc))
-    stderrprint("pc stack: " + str(pc_stack) + " <-- TOP")
+        if value is UNINITIALIZED:
+            output = ""
+        else:
+            output = TYPE_NAMES[type(value)]
+
+        self.set_value_to_var(instruction[0], output)
+
+    def check_jump(self, instruction):
+        self.jump(instruction)
+
+    def check_jumpifeq(self, instruction):
+        eq = False
+        if self.get_type(instruction[1]) == "nil" and self.get_type(instruction[2]) == "nil":
+            eq = True
+        elif self.get_type(instruction[1]) == "nil" or self.get_type(instruction[2]) == "nil":
+            pass
+        elif self.get_type(instruction[1]) == self.get_type(instruction[2]):
+            value1 = self.get_value(instruction[1])
+            value2 = self.get_value(instruction[2])
+            eq = value1 == value2
+        else:
+            error(53)
+
+        self.jump(instruction, eq)
+
+    def check_jumpifneq(self, instruction):
+        eq = False
+        if self.get_type(instruction[1]) == "nil" and self.get_type(instruction[2]) == "nil":
+            eq = True
+        elif self.get_type(instruction[1]) == "nil" or self.get_type(instruction[2]) == "nil":
+            pass
+        elif self.get_type(instruction[1]) == self.get_type(instruction[2]):
+            value1 = self.get_value(instruction[1])
+            value2 = self.get_value(instruction[2])
+            eq = value1 == value2
+        else:
+            error(53)
 
-    stderrprint("\n========== Memory frame ==========")
+        self.jump(instruction, not eq)
 
-    stderrprint("GF:")
-    stderrprint(gf)
+    def check_exit(self, instruction):
+        value = self.get_value(instruction[0])
+        if (type(value) is not int): error(53)
+        if not (0 <= value <= 49):
+            error(57)
+        else:
+            raise ProgramExit(value)
 
-    stderrprint("\nLF:")
-    stderrprint(str(lf) + " <-- TOP")
+    def check_dprint(self, instruction):
+        value = self.get_value(instruction[0])
+        self.debug_output.write(str(value))
 
-    try:
-        stderrprint("\nTF:")
-        stderrprint(tf)
-    except NameError:
-        stderrprint("TF does not exist in this scope")
+    def check_break(self, instruction):
+        self.stderrprint("\n\n==================== STATS ====================")
+        self.stderrprint("instruction_counter: " + str(self.instruction_counter))
 
-    stderrprint("==================================")
+        self.stderrprint("\nPC: " + str(self.pc))
+        self.stderrprint("pc stack: " + str(self.pc_stack) + " <-- TOP")
 
-    stderrprint("\ndata stack")
-    stderrprint(str(data_stack) + " <-- TOP")
+        self.stderrprint("\n========== Memory frame ==========")
 
-    stderrprint("\nlabels")
-    stderrprint(labels)
+        self.stderrprint("GF:")
+        self.stderrprint(named_frame(self.gf, self.gf_slots))
 
+        self.stderrprint("\nLF:")
+        self.stderrprint(str([named_frame(frame, self.local_slots) for frame in self.lf]) + " <-- TOP")
 
-def invalid_instruction(instruction):
-    exit(32)
+        self.stderrprint("\nTF:")
+        if self.tf is None:
+            self.stderrprint("TF does not exist in this scope")
+        else:
+            self.stderrprint(named_frame(self.tf, self.local_slots))
 
+        self.stderrprint("==================================")
 
-def jump(instruction, should_jump=True):
-    if instruction[0].text not in labels:
-        exit(52)
+        self.stderrprint("\ndata stack")
+        self.stderrprint(str(self.data_stack) + " <-- TOP")
 
-    if should_jump:
-        global pc
-        pc = labels[instruction[0].text]
+        self.stderrprint("\nlabels")
+        self.stderrprint(self.labels)
 
-# returns value from argument typed according to argument
-def get_value(argument):
-    value = None
+    # instruction, that was not executed yet since it was quickened or de-specialized. Types of operands are taken
+    # before the generic handler runs, because the result may overwrite an operand, and when the instruction
+    # succeeds, it is specialized for them. Operand, that can not be read, is left to the generic handler to raise the error
+    def adaptive(self, instruction):
+        generic, arguments = instruction
+        index = self.pc
 
-    if argument.attrib["type"] == "nil":
-        value = None
-    elif argument.attrib["type"] == "bool":
-        value = True if argument.text == "true" else False
-    elif argument.attrib["type"] == "int":
-        try:
-            value = int(argument.text)
-        except:
-            exit(32)
-    elif argument.attrib["type"] == "float":
         try:
-            value = float.fromhex(argument.text)
-        except:
-            exit(32)
-    elif argument.attrib["type"] == "string":
-        value = argument.text
-        value = decode_string(value)
-    elif argument.attrib["type"] == "var":
-        value = get_value_from_var(argument)
-    else:
-        exit(31)
-    return value
-
-
-# returns value stored in a frame given by argument with name given by argument
-def get_value_from_var(argument):
-    value = None
-    name = argument.text[3:]
-    frame = argument.text[0:2]
-
-    if frame == "GF":
-        if name in gf:
-            value = gf[name]
+            key = (generic, type(self.get_value(arguments[1])), type(self.get_value(arguments[2])))
+        except InterpretError:
+            key = None
+        generic(self, arguments)
+
+        self.code[index] = (QUICKENED_HANDLERS[key], arguments) if key in QUICKENED_HANDLERS else (generic, arguments)
+
+    # executes specialized instruction, whose guard failed, by the generic handler. Instruction is quickened again,
+    # until it fails too many times, then it keeps the generic handler
+    def deoptimize(self, generic, instruction):
+        misses = self.program.misses[self.pc] = self.program.misses.get(self.pc, 0) + 1
+        self.code[self.pc] = (Interpreter.adaptive, (generic, instruction)) if misses < QUICKEN_LIMIT else (generic, instruction)
+        generic(self, instruction)
+
+    # superinstructions made by the peephole pass. Every instruction of the fused sequence is counted as soon as
+    # it is done, so the count stays exact even when a later one ends the program by an error
+
+    # PUSHS, PUSHS, binary stack instruction and POPS
+    def fused_stack_operation(self, instruction):
+        first, second, operation, target = instruction
+        self.data_stack.append(self.get_value(first))
+        self.instruction_counter += 1
+        self.data_stack.append(self.get_value(second))
+        self.instruction_counter += 1
+        operation(self, ())
+        self.instruction_counter += 1
+        self.set_value_to_var(target, self.data_stack.pop())
+        self.pc += 3
+
+    # PUSHS, PUSHS and JUMPIFEQS or JUMPIFNEQS
+    def fused_stack_jump(self, instruction):
+        first, second, operation, label = instruction
+        self.data_stack.append(self.get_value(first))
+        self.instruction_counter += 1
+        self.data_stack.append(self.get_value(second))
+        self.instruction_counter += 1
+        self.pc += 2
+        operation(self, label)
+
+    # two instructions, of which only the second one may jump
+    def fused_pair(self, instruction):
+        first, first_arguments, second, second_arguments = instruction
+        first(self, first_arguments)
+        self.instruction_counter += 1
+        self.pc += 1
+        second(self, second_arguments)
+
+    # handlers selected by type inference for operands of proven types, they skip the type checks
+    def typed_add(self, instruction):
+        self.set_value_to_var(instruction[0], self.get_value(instruction[1]) + self.get_value(instruction[2]))
+
+    def typed_sub(self, instruction):
+        self.set_value_to_var(instruction[0], self.get_value(instruction[1]) - self.get_value(instruction[2]))
+
+    def typed_mul(self, instruction):
+        self.set_value_to_var(instruction[0], self.get_value(instruction[1]) * self.get_value(instruction[2]))
+
+    def typed_lt(self, instruction):
+        self.set_value_to_var(instruction[0], self.get_value(instruction[1]) < self.get_value(instruction[2]))
+
+    def typed_gt(self, instruction):
+        self.set_value_to_var(instruction[0], self.get_value(instruction[1]) > self.get_value(instruction[2]))
+
+    def typed_eq(self, instruction):
+        self.set_value_to_var(instruction[0], self.get_value(instruction[1]) == self.get_value(instruction[2]))
+
+    def typed_strlen(self, instruction):
+        self.set_value_to_var(instruction[0], len(self.get_value(instruction[1])))
+
+    def typed_jumpifeq(self, instruction):
+        self.jump(instruction, self.get_value(instruction[1]) == self.get_value(instruction[2]))
+
+    def typed_jumpifneq(self, instruction):
+        self.jump(instruction, self.get_value(instruction[1]) != self.get_value(instruction[2]))
+
+    # jumps to the target index of the instruction, that was linked before the execution
+    def jump(self, instruction, should_jump=True):
+        if should_jump:
+            self.pc = instruction[0]
+
+    # returns value of operand, literals are already parsed in the constant pool
+    def get_value(self, argument):
+        kind, value = argument
+
+        if kind != CONST:
+            value = self.get_value_from_var(argument)
+        return value
+
+    # returns frame of variable operand
+    def get_frame(self, kind):
+        if kind == GF:
+            return self.gf
+        elif kind == LF:
+            if stack_empty(self.lf): error(55)
+            return self.lf[TOP]
         else:
-            exit(54)
-
-    elif frame == "LF":
-        if not stack_empty(lf):        #Stack of local frames is not empty
-            if name in lf[TOP]:
-                value = lf[TOP][name]
-            else:
-                exit(54)
-        else:
-            exit(55)
-
-    elif frame == "TF":
-        try:
-            if name in tf:
-                value = tf[name]
+            if self.tf is None: error(55)
+            return self.tf
+
+    # returns value stored in a frame given by argument with name given by argument
+    def get_value_from_var(self, argument):
+        frame, slot = argument
+        value = self.get_frame(frame)[slot]
+
+        if value is UNDECLARED:
+            error(54)
+        if value is UNINITIALIZED:
+            error(56)
+        return value
+
+    # stores value to a frame based on argument with name given by argument
+    def set_value_to_var(self, argument, value, instruction=""):
+        kind, slot = argument
+        frame = self.get_frame(kind)
+
+        if instruction == "defvar":
+            if frame[slot] is not UNDECLARED: error(52)
+        elif frame[slot] is UNDECLARED:
+            error(54)
+
+        frame[slot] = value
+
+    # returns string with information of type based on type
+    def get_type(self, argument):
+        return TYPE_NAMES[type(self.get_value(argument))]
+
+    # prints value to standart error
+    def stderrprint(self, value):
+        self.debug_output.write(str(value) + "\n")
+
+    # keeps poping as many values from stack, asi given by "number" argument and returns array of theese values
+    def read_stack_values(self, number):
+        values = []
+        for i in range(number):
+            if stack_empty(self.data_stack):
+                error(56)
             else:
-                exit(54)
-        except NameError:
-            exit(55)
-    else:
-        exit(31)
-
-
-    if value is None:
-        exit(56)
-    return value
-
+                values.append(self.data_stack.pop())
+        return values
+
+
+# opcode: (handler, kinds of arguments)
+INSTRUCTIONS = {
+    "MOVE"          : (Interpreter.check_move,        ("var", "symb")),
+    "CREATEFRAME"   : (Interpreter.check_createframe, ()),
+    "PUSHFRAME"     : (Interpreter.check_pushframe,   ()),
+    "POPFRAME"      : (Interpreter.check_popframe,    ()),
+    "DEFVAR"        : (Interpreter.check_defvar,      ("var",)),
+    "CALL"          : (Interpreter.check_call,        ("label",)),
+    "RETURN"        : (Interpreter.check_return,      ()),
+    "PUSHS"         : (Interpreter.check_pushs,       ("symb",)),
+    "POPS"          : (Interpreter.check_pops,        ("var",)),
+    "CLEARS"        : (Interpreter.check_clears,      ()),
+    "ADDS"          : (Interpreter.check_adds,        ()),
+    "SUBS"          : (Interpreter.check_subs,        ()),
+    "MULS"          : (Interpreter.check_muls,        ()),
+    "IDIVS"         : (Interpreter.check_idivs,       ()),
+    "LTS"           : (Interpreter.check_lts,         ()),
+    "GTS"           : (Interpreter.check_gts,         ()),
+    "EQS"           : (Interpreter.check_eqs,         ()),
+    "ANDS"          : (Interpreter.check_ands,        ()),
+    "ORS"           : (Interpreter.check_ors,         ()),
+    "NOTS"          : (Interpreter.check_nots,        ()),
+    "INT2CHARS"     : (Interpreter.check_int2chars,   ()),
+    "STRI2INTS"     : (Interpreter.check_stri2ints,   ()),
+    "JUMPIFEQS"     : (Interpreter.check_jumpifeqs,   ("label",)),
+    "JUMPIFNEQS"    : (Interpreter.check_jumpifneqs,  ("label",)),
+    "ADD"           : (Interpreter.check_add,         ("var", "symb", "symb")),
+    "SUB"           : (Interpreter.check_sub,         ("var", "symb", "symb")),
+    "MUL"           : (Interpreter.check_mul,         ("var", "symb", "symb")),
+    "IDIV"          : (Interpreter.check_idiv,        ("var", "symb", "symb")),
+    "DIV"           : (Interpreter.check_div,         ("var", "symb", "symb")),
+    "LT"            : (Interpreter.check_lt,          ("var", "symb", "symb")),
+    "GT"            : (Interpreter.check_gt,          ("var", "symb", "symb")),
+    "EQ"            : (Interpreter.check_eq,          ("var", "symb", "symb")),
+    "AND"           : (Interpreter.check_and,         ("var", "symb", "symb")),
+    "OR"            : (Interpreter.check_or,          ("var", "symb", "symb")),
+    "NOT"           : (Interpreter.check_not,         ("var", "symb")),
+    "INT2CHAR"      : (Interpreter.check_int2char,    ("var", "symb")),
+    "STRI2INT"      : (Interpreter.check_stri2int,    ("var", "symb", "symb")),
+    "INT2FLOAT"     : (Interpreter.check_int2float,   ("var", "symb")),
+    "FLOAT2INT"     : (Interpreter.check_float2int,   ("var", "symb")),
+    "READ"          : (Interpreter.check_read,        ("var", "type")),
+    "WRITE"         : (Interpreter.check_write,       ("symb",)),
+    "CONCAT"        : (Interpreter.check_concat,      ("var", "symb", "symb")),
+    "STRLEN"        : (Interpreter.check_strlen,      ("var", "symb")),
+    "GETCHAR"       : (Interpreter.check_getchar,     ("var", "symb", "symb")),
+    "SETCHAR"       : (Interpreter.check_setchar,     ("var", "symb", "symb")),
+    "TYPE"          : (Interpreter.check_type,        ("var", "symb")),
+    "LABEL"         : (Interpreter.nothing,           ("label",)),
+    "JUMP"          : (Interpreter.check_jump,        ("label",)),
+    "JUMPIFEQ"      : (Interpreter.check_jumpifeq,    ("label", "symb", "symb")),
+    "JUMPIFNEQ"     : (Interpreter.check_jumpifneq,   ("label", "symb", "symb")),
+    "EXIT"          : (Interpreter.check_exit,        ("symb",)),
+    "DPRINT"        : (Interpreter.check_dprint,      ("symb",)),
+    "BREAK"         : (Interpreter.check_break,       ())
+}
+
+# handler: opcode
+OPCODES = {handler: opcode for opcode, (handler, kinds) in INSTRUCTIONS.items()}
+
+# stack instructions, that pop two values and push one result
+BINARY_STACK_HANDLERS = {Interpreter.check_adds, Interpreter.check_subs, Interpreter.check_muls, Interpreter.check_idivs,
+                         Interpreter.check_lts, Interpreter.check_gts, Interpreter.check_eqs, Interpreter.check_ands,
+                         Interpreter.check_ors, Interpreter.check_stri2ints}
+
+# pairs of instructions fused by the peephole pass
+FUSED_PAIRS = {(Interpreter.check_defvar, Interpreter.check_move), (Interpreter.check_move, Interpreter.check_jumpifeq),
+               (Interpreter.check_move, Interpreter.check_jumpifneq), (Interpreter.check_move, Interpreter.typed_jumpifeq),
+               (Interpreter.check_move, Interpreter.typed_jumpifneq)}
+
+# instructions, that transfer control and end a basic block
+CONTROL_HANDLERS = {Interpreter.check_jump, Interpreter.check_jumpifeq, Interpreter.check_jumpifneq, Interpreter.check_jumpifeqs,
+                    Interpreter.check_jumpifneqs, Interpreter.check_call, Interpreter.check_return, Interpreter.check_exit}
+
+# instructions without side effects, that are folded, when all their operands are constant
+FOLDABLE_HANDLERS = {Interpreter.check_add, Interpreter.check_sub, Interpreter.check_mul, Interpreter.check_idiv, Interpreter.check_div,
+                     Interpreter.check_lt, Interpreter.check_gt, Interpreter.check_eq, Interpreter.check_and, Interpreter.check_or,
+                     Interpreter.check_not, Interpreter.check_concat, Interpreter.check_strlen, Interpreter.check_int2char,
+                     Interpreter.check_stri2int, Interpreter.check_getchar, Interpreter.check_int2float, Interpreter.check_float2int}
+
+# types of operands (symb arguments in order), that are required by instructions with fixed types
+OPERAND_TYPES = {
+    Interpreter.check_idiv: ("int", "int"),
+    Interpreter.check_div: ("float", "float"),
+    Interpreter.check_and: ("bool", "bool"),
+    Interpreter.check_or: ("bool", "bool"),
+    Interpreter.check_not: ("bool",),
+    Interpreter.check_concat: ("string", "string"),
+    Interpreter.check_strlen: ("string",),
+    Interpreter.check_int2char: ("int",),
+    Interpreter.check_stri2int: ("string", "int"),
+    Interpreter.check_getchar: ("string", "int"),
+    Interpreter.check_setchar: ("int", "string"),
+    Interpreter.check_int2float: ("int",),
+    Interpreter.check_float2int: ("float",),
+}
+
+# types of results of instructions, that always produce the same type
+RESULT_TYPES = {
+    Interpreter.check_idiv: "int", Interpreter.check_div: "float", Interpreter.check_lt: "bool", Interpreter.check_gt: "bool",
+    Interpreter.check_eq: "bool", Interpreter.check_and: "bool", Interpreter.check_or: "bool", Interpreter.check_not: "bool",
+    Interpreter.check_concat: "string", Interpreter.check_strlen: "int", Interpreter.check_int2char: "string",
+    Interpreter.check_stri2int: "int", Interpreter.check_getchar: "string", Interpreter.check_setchar: "string",
+    Interpreter.check_int2float: "float", Interpreter.check_float2int: "int", Interpreter.check_type: "string",
+}
+
+# (handler, types of operands): typed handler, that is used, when the types are proven. Only combinations,
+# for which the checked handler can not raise a type error, are listed
+TYPED_HANDLERS = {
+    **{(handler, name, name): typed for handler, typed in ((Interpreter.check_add, Interpreter.typed_add),
+                                                            (Interpreter.check_sub, Interpreter.typed_sub),
+                                                            (Interpreter.check_mul, Interpreter.typed_mul))
+       for name in ("int", "float")},
+    **{(handler, first, second): typed for handler, typed in ((Interpreter.check_eq, Interpreter.typed_eq),
+                                                               (Interpreter.check_jumpifeq, Interpreter.typed_jumpifeq),
+                                                               (Interpreter.check_jumpifneq, Interpreter.typed_jumpifneq))
+       for first in TYPE_NAMES.values() for second in TYPE_NAMES.values() if first == second or "nil" in (first, second)},
+    **{(handler, name, name): typed for handler, typed in ((Interpreter.check_lt, Interpreter.typed_lt),
+                                                            (Interpreter.check_gt, Interpreter.typed_gt))
+       for name in TYPE_NAMES.values() if name != "nil"},
+    (Interpreter.check_concat, "string", "string"): Interpreter.typed_add,
+    (Interpreter.check_strlen, "string"): Interpreter.typed_strlen,
+}
+
+# (generic handler, types of operands): handler specialized by quickening
+QUICKENED_HANDLERS = {
+    **{(generic, kind, kind): quickened_store(generic, operation, kind, kind)
+       for generic, operation in ((Interpreter.check_add, operator.add), (Interpreter.check_sub, operator.sub),
+                                  (Interpreter.check_mul, operator.mul))
+       for kind in (int, float)},
+    **{(generic, kind, kind): quickened_store(generic, operation, kind, kind)
+       for generic, operation in ((Interpreter.check_lt, operator.lt), (Interpreter.check_gt, operator.gt))
+       for kind in (int, float, bool, str)},
+    **{(generic, first, second): factory(generic, operation, first, second)
+       for generic, factory, operation in ((Interpreter.check_eq, quickened_store, operator.eq),
+                                           (Interpreter.check_jumpifeq, quickened_jump, operator.eq),
+                                           (Interpreter.check_jumpifneq, quickened_jump, operator.ne))
+       for first in TYPE_NAMES for second in TYPE_NAMES if first is second or type(None) in (first, second)},
+    (Interpreter.check_concat, str, str): quickened_store(Interpreter.check_concat, operator.add, str, str),
+}
+
+# instructions replaced by adaptive instructions by quickening
+QUICKENING_HANDLERS = {generic for generic, first, second in QUICKENED_HANDLERS}
+
+# number of failed guards, after which the instruction is no longer specialized
+QUICKEN_LIMIT = 4
+
+# maximal number of bits of folded integer and characters of folded string
+FOLD_LIMIT = 1024
+
+# optimization passes by name, passes run in this order regardless of order of their names
+OPTIMIZATIONS = {"dataflow": dataflow, "types": infer_types, "peephole": peephole, "quicken": quicken}
+
+
+
+def named_frame(frame, slots):
+    named = {}
+    for name, slot in slots.items():
+        if frame[slot] is UNINITIALIZED:
+            named[name] = None
+        elif frame[slot] is not UNDECLARED:
+            named[name] = frame[slot]
+    return named
+
+
+@functools.lru_cache(maxsize=4096)
+def decode_string(value):
+    if "\\" not in value: return value
 
-# stores value to a frame based on argument with name given by argument
-def set_value_to_var(argument, value, instruction=""):
+    return ESCAPE_SEQUENCE.sub(decode_escape, value)
 
-    frame = argument.text[0:2]
-    name = argument.text[3:]
 
-    if type(value) is str:
-        value = decode_string(value)
+# returns character of one escape sequence match
+def decode_escape(match):
+    if match.group(1) is None:
+        raise ValueError("invalid escape sequence")
+    return chr(int(match.group(1)))
 
-    if frame == "GF":
-        if name in gf and instruction == "defvar": exit(52)
 
-        if name not in gf and instruction != "defvar": exit(54)
-        gf[name] = value
-        global gf_counter
-        gf_counter += 1
+# returns true, if stack is empty, otherwise returns false
+def stack_empty(stack):
+    return True if len(stack) == 0 else False
 
-    elif frame == "LF":
-        if stack_empty(lf): exit(55)
-        if name in lf[TOP] and instruction == "defvar": exit(52)
 
+class OutputBuffer:
+    def __init__(self, stream, line_buffered=False, size=1 << 16):
+        self.stream = stream
+        self.line_buffered = line_buffered
+        self.size = size
+        self.parts = []
+        self.length = 0
+
+    def write(self, text):
+        self.parts.append(text)
+        self.length += len(text)
+        if self.length >= self.size or (self.line_buffered and "\n" in text):
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.stream.write("".join(self.parts))
+            self.parts = []
+            self.length = 0
+        self.stream.flush()
+
+
+# compiled programs of the server by hash of their XML. When total size of the programs exceeds the capacity,
+# the least recently used programs are evicted. Size of a program is size of its marshalled form
+class ProgramCache:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.programs = collections.OrderedDict()   # hash: (program, size)
+        self.size = 0
+        self.lock = threading.Lock()
+
+    # returns compiled program, that is loaded when it is not cached. Errors of loading are raised
+    def get(self, source):
+        import hashlib
+
+        key = hashlib.sha256(source).digest()
+        with self.lock:
+            if key in self.programs:
+                self.programs.move_to_end(key)
+                return self.programs[key][0]
+
+        program = load_program(io.BytesIO(source))
+        size = len(program_payload(program))
+
+        with self.lock:
+            if key not in self.programs:
+                self.programs[key] = (program, size)
+                self.size += size
+            while self.size > self.capacity and self.programs:
+                evicted, evicted_size = self.programs.popitem(last=False)[1]
+                self.size -= evicted_size
+        return program
+
+
+# cooperative scheduler of many interpreters in one asyncio event loop. Every instance executes at most quantum
+# instructions multiplied by its weight and then yields to the others. Instance, that reads a line, which has not
+# arrived yet, is suspended until it is fed. Budget limits number of executed instructions of an instance
+class Scheduler:
+    def __init__(self, quantum=1000, budget=None):
+        self.quantum = quantum
+        self.budget = budget
+        self.instances = []
+
+    # starts new instance of the program in the running event loop and returns it
+    def spawn(self, program, weight=1, budget=None, output=None, debug_output=None):
+        import asyncio
+
+        instance = Instance(program, output, debug_output)
+        budget = self.budget if budget is None else budget
+        instance.task = asyncio.get_running_loop().create_task(self.run_instance(instance, self.quantum * weight, budget))
+        self.instances.append(instance)
+        return instance
+
+    # waits until all spawned instances end
+    async def join(self):
+        import asyncio
+
+        await asyncio.gather(*(instance.task for instance in self.instances))
+
+    async def run_instance(self, instance, quantum, budget):
+        import asyncio
+
+        interpreter = instance.interpreter
+        # labels counted in the first pass are not part of the budget
+        limit = None if budget is None else interpreter.instruction_counter + budget
 
-        if name not in lf[TOP] and instruction != "defvar":
-            exit(54)
-        lf[TOP][name] = value
-        global lf_counter
-        lf_counter += 1
+        try:
+            while True:
+                if limit is not None:
+                    quantum = min(quantum, limit - interpreter.instruction_counter)
+                try:
+                    if interpreter.execute_quantum(quantum):
+                        instance.exit_code = 0
+                        break
+                except InputPending:
+                    # output written so far is usually a prompt for the awaited input
+                    interpreter.output.flush()
+                    interpreter.debug_output.flush()
+                    await instance.input.wait()
+                    continue
+
+                if limit is not None and interpreter.instruction_counter >= limit:
+                    instance.error = "budget"
+                    break
+                await asyncio.sleep(0)
+        except (ProgramExit, InterpretError) as end:
+            instance.exit_code = end.code
+        finally:
+            interpreter.output.flush()
+            interpreter.debug_output.flush()
+
+
+# one interpreter run by the scheduler. Input is fed by feed and ended by close, outputs are text streams, that
+# are collected in memory by default. Exit code is None until the program ends, error is "budget", when the
+# program was stopped for exceeding its budget
+class Instance:
+    def __init__(self, program, output=None, debug_output=None):
+        self.input = StreamInput()
+        self.output = io.StringIO() if output is None else output
+        self.debug_output = io.StringIO() if debug_output is None else debug_output
+        self.interpreter = Interpreter(program, self.input, self.output, self.debug_output)
+        self.exit_code = None
+        self.error = None
+        self.task = None
+
+    def feed(self, text):
+        self.input.feed(text)
+
+    def close(self):
+        self.input.close()
+
+
+# wall time of interpretation phases for --metrics, every phase ends when the next one starts
+class PhaseTimer:
+    def __init__(self):
+        self.phases = {}
+        self.start = time.perf_counter()
+
+    def end(self, name):
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + now - self.start
+        self.start = now
+
+
+# execution profile of the program, number of executions and cumulative wall time of every instruction
+class Profile:
+    def __init__(self, program, file, as_json=False):
+        self.program = program
+        self.code = program.code
+        self.file = file
+        self.as_json = as_json
+        self.counts = [0] * len(program.code)
+        self.times = [0.0] * len(program.code)
+
+    def record(self, index, elapsed):
+        self.counts[index] += 1
+        self.times[index] += elapsed
+
+    # returns statistics of opcodes and of executed instructions, both sorted by time from the most expensive
+    def report(self):
+        opcodes = {}
+        instructions = []
+        instruction_orders = sorted(self.program.orders)
+
+        for index, (handler, arguments) in enumerate(self.code):
+            if self.counts[index] == 0: continue
+
+            opcode = OPCODES[handler]
+            statistics = opcodes.setdefault(opcode, {"opcode": opcode, "count": 0, "time": 0.0})
+            statistics["count"] += self.counts[index]
+            statistics["time"] += self.times[index]
+            instructions.append({
+                "index": index,
+                "order": instruction_orders[index],
+                "opcode": opcode,
+                "count": self.counts[index],
+                "time": self.times[index]
+            })
+
+        return {
+            "instructions": sum(self.counts),
+            "time": sum(self.times, 0.0),
+            "opcodes": sorted(opcodes.values(), key=lambda statistics: statistics["time"], reverse=True),
+            "by_instruction": sorted(instructions, key=lambda statistics: statistics["time"], reverse=True)
+        }
+
+    def write(self):
+        with self.file as file:
+            self.write_report(file)
+
+    def write_report(self, file):
+        report = self.report()
+        if self.as_json:
+            import json
+            json.dump(report, file, indent=1)
+            file.write("\n")
+            return
+
+        file.write("instructions: %d\ntime: %.6f s\n\n" % (report["instructions"], report["time"]))
+        file.write("%-12s %12s %14s %12s\n" % ("opcode", "count", "time [s]", "avg [us]"))
+        for statistics in report["opcodes"]:
+            file.write("%-12s %12d %14.6f %12.3f\n" % (statistics["opcode"], statistics["count"], statistics["time"],
+                                                       statistics["time"] / statistics["count"] * 1e6))
+
+        file.write("\n%8s %8s %-12s %12s %14s %12s\n" % ("index", "order", "opcode", "count", "time [s]", "avg [us]"))
+        for statistics in report["by_instruction"]:
+            file.write("%8d %8d %-12s %12d %14.6f %12.3f\n" % (statistics["index"], statistics["order"], statistics["opcode"],
+                                                               statistics["count"], statistics["time"],
+                                                               statistics["time"] / statistics["count"] * 1e6))
+
+
+# call graph of the program. Instructions are attributed to the stack of labels called by CALL instruction and
+# written in collapsed stack format of flame graphs, one line per stack weighted by number of executed
+# instructions or by wall time in microseconds
+class CallGraph:
+    def __init__(self, interpreter, file, time_file=None):
+        self.interpreter = interpreter
+        self.file = file
+        self.time_file = time_file
+        self.names = {index: name for name, index in interpreter.labels.items()}
+        self.stacks = ["main"]
+        # main stack is always written, even when no instruction was executed
+        self.counts = {"main": 0}
+        self.times = {"main": 0.0}
+
+    # CALL is attributed to the caller and RETURN to the callee, the stack follows depth of pc_stack
+    def record(self, index, elapsed):
+        stack = self.stacks[TOP]
+        self.counts[stack] = self.counts.get(stack, 0) + 1
+        self.times[stack] = self.times.get(stack, 0.0) + elapsed
+
+        depth = len(self.interpreter.pc_stack)
+        if depth >= len(self.stacks):
+            self.stacks.append(stack + ";" + self.names[self.interpreter.pc])
+        elif depth < len(self.stacks) - 1:
+            self.stacks.pop()
+
+    def write(self):
+        if self.file is not None:
+            with self.file as file:
+                for stack in sorted(self.counts):
+                    file.write("%s %d\n" % (stack, self.counts[stack]))
+
+        if self.time_file is not None:
+            with self.time_file as file:
+                for stack in sorted(self.times):
+                    file.write("%s %d\n" % (stack, round(self.times[stack] * 1e6)))
+
+
+# runtime statistics of STATI extension, that are tracked after every executed instruction:
+#   hot     order of the most executed instruction, the lowest order wins when more instructions are executed equally
+#   vars    peak number of initialized variables in all existing frames
+#   stack   peak number of values on the data stack
+#   frames  peak number of frames on the stack of local frames
+#   calls   peak depth of calls
+class Statistics:
+    def __init__(self, interpreter, requested):
+        self.interpreter = interpreter
+        self.code = code = interpreter.code
+        self.counts = [0] * len(code) if "hot" in requested else None
+        self.track_vars = "vars" in requested
+        self.track_stack = "stack" in requested
+        self.track_frames = "frames" in requested
+        self.track_calls = "calls" in requested
+
+        self.vars = 0
+        self.stack = 0
+        self.frames = 0
+        self.calls = 0
+
+        # initialized variables are counted incrementally, every frame remembers slots of its initialized variables
+        self.variables = 0
+        self.initialized = {}
+        self.tf = None
+        self.targets = [arguments[0] if INSTRUCTIONS[OPCODES[handler]][1][:1] == ("var",) and handler is not Interpreter.check_defvar
+                        else None for handler, arguments in code]
+
+    def record(self, index, elapsed):
+        interpreter = self.interpreter
+        if self.counts is not None:
+            self.counts[index] += 1
+        if self.track_vars:
+            self.record_vars(index)
+        if self.track_stack and len(interpreter.data_stack) > self.stack:
+            self.stack = len(interpreter.data_stack)
+        if self.track_frames and len(interpreter.lf) > self.frames:
+            self.frames = len(interpreter.lf)
+        if self.track_calls and len(interpreter.pc_stack) > self.calls:
+            self.calls = len(interpreter.pc_stack)
+
+    def record_vars(self, index):
+        gf, lf, tf = self.interpreter.gf, self.interpreter.lf, self.interpreter.tf
+
+        handler = self.code[index][0]
+        if handler in (Interpreter.check_createframe, Interpreter.check_pushframe, Interpreter.check_popframe):
+            # temporary frame, that was neither pushed to local frames, is discarded with its variables
+            if self.tf is not None and self.tf is not tf and not (lf and lf[TOP] is self.tf):
+                self.variables -= len(self.initialized.pop(id(self.tf), ()))
+            self.tf = tf
+            return
+
+        target = self.targets[index]
+        if target is None: return
+
+        kind, slot = target
+        if kind == GF:
+            frame = gf
+        elif kind == LF:
+            frame = lf[TOP] if lf else None
+        else:
+            frame = tf
+
+        # instruction might have ended by an error before the variable was written
+        if frame is None or frame[slot] is UNDECLARED or frame[slot] is UNINITIALIZED: return
+
+        initialized = self.initialized.setdefault(id(frame), set())
+        if slot not in initialized:
+            initialized.add(slot)
+            self.variables += 1
+            if self.variables > self.vars:
+                self.vars = self.variables
+
+    def value(self, name):
+        if name == "hot":
+            if not self.counts: return ""
+            return sorted(self.interpreter.program.orders)[self.counts.index(max(self.counts))]
+        return getattr(self, name)
+
+
+# sampling profiler for long running programs. Background thread periodically takes snapshot of pc, so the
+# execution loop itself is not slowed down. Report shows histogram of samples by labels, by instruction
+# ranges between labels, by opcodes and by depth of pc_stack
+class Sampler(threading.Thread):
+    def __init__(self, interpreter, file, interval):
+        super().__init__(daemon=True)
+        self.interpreter = interpreter
+        self.code = interpreter.code
+        self.file = file
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.samples = {}
+        self.depths = {}
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            index = self.interpreter.pc
+            depth = len(self.interpreter.pc_stack)
+            if 0 <= index < len(self.code):
+                self.samples[index] = self.samples.get(index, 0) + 1
+                self.depths[depth] = self.depths.get(depth, 0) + 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    # returns histograms of samples, ranges are sequences of instructions starting at label or at program start
+    def report(self):
+        instruction_orders = sorted(self.interpreter.program.orders)
+        names = {index: name for name, index in self.interpreter.labels.items()}
+        starts = [0] + sorted(index for index in names if index != 0)
+
+        ranges = {}
+        opcodes = {}
+        for index, count in self.samples.items():
+            start = starts[bisect.bisect_right(starts, index) - 1]
+            statistics = ranges.setdefault(start, {"label": names.get(start, "main"), "samples": 0})
+            statistics["samples"] += count
+
+            opcode = OPCODES[self.code[index][0]]
+            opcodes[opcode] = opcodes.get(opcode, 0) + count
+
+        by_label = {}
+        for start, statistics in ranges.items():
+            position = bisect.bisect_left(starts, start)
+            end = starts[position + 1] - 1 if position + 1 < len(starts) else len(self.code) - 1
+            statistics["indexes"] = (start, end)
+            statistics["orders"] = (instruction_orders[start], instruction_orders[end])
+            by_label[statistics["label"]] = by_label.get(statistics["label"], 0) + statistics["samples"]
+
+        return {
+            "samples": sum(self.samples.values()),
+            "labels": sorted(by_label.items(), key=lambda item: item[1], reverse=True),
+            "ranges": sorted(ranges.values(), key=lambda statistics: statistics["samples"], reverse=True),
+            "opcodes": sorted(opcodes.items(), key=lambda item: item[1], reverse=True),
+            "depths": sorted(self.depths.items())
+        }
+
+    def write(self):
+        report = self.report()
+        total = max(report["samples"], 1)
+
+        with self.file as file:
+            file.write("samples: %d\ninterval: %.3f ms\n" % (report["samples"], self.interval * 1000))
+
+            file.write("\n%8s %8s  %s\n" % ("%", "samples", "label"))
+            for label, count in report["labels"]:
+                file.write("%8.2f %8d  %s\n" % (count * 100 / total, count, label))
+
+            file.write("\n%8s %8s %15s %15s  %s\n" % ("%", "samples", "indexes", "orders", "label"))
+            for statistics in report["ranges"]:
+                file.write("%8.2f %8d %15s %15s  %s\n" % (statistics["samples"] * 100 / total, statistics["samples"],
+                                                         "%d-%d" % statistics["indexes"], "%d-%d" % statistics["orders"],
+                                                         statistics["label"]))
+
+            file.write("\n%8s %8s  %s\n" % ("%", "samples", "opcode"))
+            for opcode, count in report["opcodes"]:
+                file.write("%8.2f %8d  %s\n" % (count * 100 / total, count, opcode))
+
+            file.write("\n%8s %8s  %s\n" % ("%", "samples", "call depth"))
+            for depth, count in report["depths"]:
+                file.write("%8.2f %8d  %d\n" % (count * 100 / total, count, depth))
+
+
+# reader of the interpreted program input, that returns one line for every READ instruction. Regular files are
+# memory mapped, other sources (pipes, terminals, text streams) are read by lines, so memory use does not depend
+# on size of the input
+class InputReader:
+    def __init__(self, file):
+        self.file = file
+        self.data = None
+        self.position = 0
 
-    elif frame == "TF":
         try:
-            if name in tf and instruction == "defvar": exit(52)
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, io.UnsupportedOperation):
+            # empty files, pipes and terminals can not be mapped
+            pass
+
+    # returns next line without the line ending or None at the end of input
+    def readline(self):
+        if self.data is not None:
+            if self.position >= len(self.data): return None
+
+            end = self.data.find(b"\n", self.position)
+            end = len(self.data) if end < 0 else end + 1
+            line = self.data[self.position:end]
+            self.position = end
+        else:
+            line = self.file.readline()
+            if not line: return None
 
-            if name not in tf and instruction != "defvar": exit(54)
-            tf[name] = value
-            global tf_counter
-            tf_counter += 1
-        except NameError:
-            exit(55)
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", "replace")
+        return line.rstrip()
 
-    else:
-        exit(31)
-
-
-# returns string with information of type based on type
-def get_type(argument):
-    var_type = argument.attrib["type"]
-
-    if argument.attrib["type"] == "var":
-        value = get_value_from_var(argument)
-        if type(value) is int:
-            var_type = "int"
-        elif type(value) is float:
-            var_type = "float"
-        elif type(value) is str:
-            var_type = "string"
-        elif type(value) is bool:
-            var_type = "bool"
-        elif  value is None:
-            var_type = "nil"
-        else:
-            exit(31)
-    return var_type
+    # returns next line converted to given type, end of input or invalid value is nil
+    def read(self, type):
+        line = self.readline()
+        if line is None: return None
 
+        return READ_CONVERSIONS[type](line)
 
-# decodes ASCII characters from decadic format to string
-def decode_string(value):
-    decoded = ""
-    i = 0
-    if value is None:
-        value = ""
+    # releases the mapping and closes the input file
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
 
-    if value == "": return ""
 
-    while i < len(value):
-        if value[i] == "\\":
-            decoded = decoded + chr(int(value[i+1:i+4]))
-            i += 4
-        else:
-            decoded = decoded + value[i]
-            i += 1
-    return decoded
+# input of a scheduled instance, that is fed with text by the host. Line, that has not arrived yet, suspends
+# the instance by InputPending instead of blocking the whole event loop
+class StreamInput(InputReader):
+    def __init__(self):
+        self.lines = collections.deque()
+        self.pending = ""       # fed text after the last line ending
+        self.closed = False
 
+        import asyncio
+        self.arrived = asyncio.Event()
 
+    def feed(self, text):
+        *lines, self.pending = (self.pending + text).split("\n")
+        self.lines.extend(lines)
+        self.arrived.set()
 
-# returns true, if stack is empty, otherwise returns false
-def stack_empty(stack):
-    return True if len(stack) == 0 else False
+    # ends the input, READ returns nil after the last line
+    def close(self):
+        if self.pending:
+            self.lines.append(self.pending)
+            self.pending = ""
+        self.closed = True
+        self.arrived.set()
 
+    def readline(self):
+        if self.lines: return self.lines.popleft().rstrip()
+        if self.closed: return None
 
-# prints value to standart error
-def stderrprint(value):
-    print(value, file = sys.stderr)
+        raise InputPending()
 
+    # waits until more input is fed or the input is closed
+    async def wait(self):
+        await self.arrived.wait()
+        self.arrived.clear()
 
-# function, that reads from file
-def file_read():
-    global input_words
-    global input_words_counter
 
-    value = input_words[input_words_counter]
-    input_words_counter += 1
-    return value
+def read_bool(line):
+    return line.lower() == "true"
 
 
-# keeps poping as many values from stack, asi given by "number" argument and returns array of theese values
-def read_stack_values(number):
-    values = []
-    for i in range(number):
-        if stack_empty(data_stack):
-            exit(56)
-        else:
-            values.append(data_stack.pop())
-    return values
+def read_int(line):
+    try:
+        return int(line)
+    except ValueError:
+        return None
 
 
-def xml_structure_ok(program):
-    global orders
-    ok = True
+def read_float(line):
+    try:
+        return float.fromhex(line)
+    except (ValueError, OverflowError):
+        return None
 
-    for instruction in program:
 
-        if instruction.tag != "instruction": ok = False
+def read_string(line):
+    return line
 
-        instruction = sort_xml(instruction)
-        for i in range(0, len(instruction)):
-            if instruction[i].tag != "arg" + str(i + 1): ok = False
 
+# conversions of input lines by READ type
+READ_CONVERSIONS = {"bool": read_bool, "int": read_int, "float": read_float, "string": read_string}
 
-        if 'opcode' not in instruction.keys(): ok = False
 
-        if 'order' not in instruction.keys(): ok = False
+# checks structure of one instruction element in constant time, arguments are its children sorted by tag.
+# Checks opcode, order, number, tags and types of arguments, orders are orders of already loaded instructions
+def xml_structure_ok(instruction, arguments, orders):
+    if instruction.tag != "instruction": return False
 
-        try:
-            if int(instruction.attrib['order']) <= 0:
-                ok = False
-            if instruction.attrib['order'] in orders:
-                #print(orders)
-                #print(instruction.attrib['order'])
-                ok = False
-            orders.append(instruction.attrib['order'])
-        except:
-            ok = False
-    return ok
+    opcode = instruction.get("opcode", "").upper()
+    if opcode not in INSTRUCTIONS: return False
 
+    kinds = INSTRUCTIONS[opcode][1]
+    if len(arguments) != len(kinds): return False
 
-def sort_xml(program):
-    def get_key(instruction):
-        if instruction.tag == "instruction":
-            return int(instruction.get("order"))
-        else:
-            return instruction.tag
+    for i in range(0, len(arguments)):
+        if arguments[i].tag != "arg" + str(i + 1): return False
+        if arguments[i].get("type") not in ARGUMENT_TYPES[kinds[i]]: return False
+
+        if kinds[i] == "label":
+            if not arguments[i].text: return False
+        elif kinds[i] == "type":
+            if arguments[i].text not in READ_TYPES: return False
 
-    roottag = program.tag
-    roottext = program.text
-    roottail = program.tail
-    rootattrib = program.attrib
-    sorted_tree = XML.Element(None)
     try:
-        sorted_tree[:] = sorted(program, key = get_key)
-    except:
-        exit(32)
-    sorted_tree.tag = roottag
-    sorted_tree.text = roottext
-    sorted_tree.tail = roottail
-    sorted_tree.attrib = rootattrib
-    return sorted_tree
+        order = int(instruction.get("order"))
+    except (TypeError, ValueError):
+        return False
+
+    if order <= 0 or order in orders: return False
+    orders.add(order)
+    return True
 
 
 
@@ -1197,6 +2694,32 @@ def help():
     print("--help                   prints the help. Can not be used with other arguments")
     print("--source=file            input XML file with XML representation of IPPcode20. Otherwise read from stdin")
     print("--input=file             input file for interpretation. Otherwise read from stdin")
+    print("--stats=file             writes statistics to the file in the order of following arguments:")
+    print("  --insts                number of executed instructions")
+    print("  --hot                  order of the most executed instruction")
+    print("  --vars                 peak number of initialized variables")
+    print("  --stack                peak number of values on the data stack")
+    print("  --frames               peak number of local frames")
+    print("  --calls                peak depth of calls")
+    print("--cache=directory        keeps compiled programs in the directory and reuses them in later runs")
+    print("--line-buffered          writes output after every line instead of in large blocks")
+    print("--profile=file           writes execution count and time of every opcode and instruction to the file,")
+    print("                         in JSON when the file name ends with .json")
+    print("--flamegraph=file        writes stacks of called labels weighted by executed instructions to the file")
+    print("--flamegraph-time=file   writes stacks of called labels weighted by wall time in microseconds to the file")
+    print("--sample=file            periodically samples executed instruction and writes histogram of hot labels,")
+    print("                         instruction ranges, opcodes and call depths to the file")
+    print("--sample-interval=ms     interval of sampling in milliseconds, 5 by default")
+    print("--metrics=file           writes time of interpretation phases, instructions per second, peak memory")
+    print("                         and exit code to the file in OpenMetrics text format")
+    print("--optimize=passes        comma separated optimization passes of the program: dataflow, types,")
+    print("                         peephole, quicken")
+    print("--batch=manifest         runs jobs of the manifest, one JSON object per line with \"source\" and optional")
+    print("                         \"input\" and \"id\", and writes their output and exit code as JSON lines")
+    print("--jobs=n                 number of worker processes of the batch, number of processors by default")
+    print("--batch-output=directory writes output of every job and results.jsonl to the directory instead")
+    print("--serve=socket           serves runs of programs on the Unix domain socket, one JSON request per line")
+    print("--serve-cache=bytes      size of cached compiled programs of the server, 64 MiB by default")
     print("================================")
     print("\n")
     print("========= return values =========")
@@ -1215,26 +2738,10 @@ def help():
     print("=================================")
 
 if __name__ == "__main__":
-    # Global variables initializations
-    gf = {}         # Global Frame initialization
-    lf = []         # Local Frame initialization
-
-    gf_counter = 0
-    lf_counter = 0
-    tf_counter = 0
-
-    pc = 0          # Program counter
-    pc_stack = []
-
-    data_stack = []
-    labels = {}
-
-    instruction_counter = 0
-
-    input_words = []
-    input_words_counter = 0
-
-    orders = []
+    # errors of the interpretation are turned into exit code of the interpret
+    try:
+        exit_code = main()
+    except InterpretError as interpret_error:
+        exit_code = interpret_error.code
 
-    main()
-    
\ No newline at end of file
+    sys.exit(exit_code)
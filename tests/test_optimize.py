@@ -0,0 +1,315 @@
+import io
+import os
+import subprocess
+import sys
+import xml.sax.saxutils
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import interpret
+
+# instructions, whose first argument is a label
+LABEL_OPCODES = {"LABEL", "JUMP", "JUMPIFEQ", "JUMPIFNEQ", "CALL", "JUMPIFEQS", "JUMPIFNEQS"}
+
+
+# returns XML representation of a program written in IPPcode20, one instruction per line
+def to_xml(source):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<program language="IPPcode20">']
+    order = 0
+    for line in source.splitlines():
+        parts = line.split()
+        if not parts: continue
+
+        opcode = parts[0].upper()
+        order += 1
+        lines.append('<instruction order="%d" opcode="%s">' % (order, opcode))
+        for number, argument in enumerate(parts[1:], 1):
+            if number == 1 and opcode in LABEL_OPCODES:
+                kind, value = "label", argument
+            elif number == 2 and opcode == "READ":
+                kind, value = "type", argument
+            elif argument[:3] in ("GF@", "LF@", "TF@"):
+                kind, value = "var", argument
+            else:
+                kind, value = argument.split("@", 1)
+            lines.append('<arg%d type="%s">%s</arg%d>' % (number, kind, xml.sax.saxutils.escape(value), number))
+        lines.append('</instruction>')
+    lines.append('</program>')
+    return "\n".join(lines).encode()
+
+
+# runs the program optimized by the given passes and returns its exit code, output and number of instructions
+def run(source, passes=(), input_text=""):
+    program = interpret.load_program(io.BytesIO(to_xml(source)))
+    interpret.optimize_program(program, passes)
+
+    output = io.StringIO()
+    interpreter = interpret.Interpreter(program, io.BytesIO(input_text.encode()), output, io.StringIO())
+    try:
+        exit_code = interpreter.run()
+    except interpret.InterpretError as interpret_error:
+        exit_code = interpret_error.code
+    return exit_code, output.getvalue(), interpreter.instruction_counter
+
+
+CALLS = """
+DEFVAR GF@n
+DEFVAR GF@r
+MOVE GF@n int@6
+CALL factorial
+WRITE GF@r
+EXIT int@0
+LABEL factorial
+JUMPIFNEQ recurse GF@n int@0
+MOVE GF@r int@1
+RETURN
+LABEL recurse
+PUSHS GF@n
+SUB GF@n GF@n int@1
+CALL factorial
+POPS GF@n
+MUL GF@r GF@r GF@n
+RETURN
+"""
+
+LOOP = """
+DEFVAR GF@i
+DEFVAR GF@s
+MOVE GF@i int@0
+MOVE GF@s string@
+LABEL loop
+CONCAT GF@s GF@s string@a
+PUSHS GF@i
+PUSHS int@1
+ADDS
+POPS GF@i
+JUMPIFNEQ loop GF@i int@5
+WRITE GF@s
+WRITE GF@i
+"""
+
+FRAMES = """
+CREATEFRAME
+DEFVAR TF@x
+MOVE TF@x int@3
+PUSHFRAME
+DEFVAR GF@y
+ADD GF@y LF@x int@4
+POPFRAME
+WRITE GF@y
+WRITE TF@x
+"""
+
+TYPE_ERROR = """
+DEFVAR GF@x
+MOVE GF@x int@1
+WRITE GF@x
+ADD GF@x GF@x string@a
+WRITE GF@x
+"""
+
+DEAD_LABELS = """
+DEFVAR GF@x
+MOVE GF@x int@1
+JUMP end
+LABEL dead
+MOVE GF@x int@2
+WRITE GF@x
+LABEL unused
+LABEL end
+WRITE GF@x
+"""
+
+DIVISION_BY_ZERO = """
+DEFVAR GF@x
+MOVE GF@x int@7
+IDIV GF@x GF@x int@2
+WRITE GF@x
+IDIV GF@x GF@x int@0
+WRITE GF@x
+"""
+
+READ = """
+DEFVAR GF@x
+DEFVAR GF@y
+READ GF@x int
+READ GF@y int
+ADD GF@x GF@x GF@y
+WRITE GF@x
+"""
+
+PROGRAMS = {"calls": CALLS, "loop": LOOP, "frames": FRAMES, "type_error": TYPE_ERROR, "dead_labels": DEAD_LABELS,
+            "division_by_zero": DIVISION_BY_ZERO, "read": READ}
+
+
+@pytest.mark.parametrize("passes", [[name] for name in interpret.OPTIMIZATIONS] + [list(interpret.OPTIMIZATIONS)])
+@pytest.mark.parametrize("name", PROGRAMS)
+def test_optimized_run_is_same(name, passes):
+    assert run(PROGRAMS[name], passes, "2\n3\n") == run(PROGRAMS[name], (), "2\n3\n")
+
+
+def test_expected_results():
+    assert run(CALLS)[:2] == (0, "720")
+    assert run(LOOP)[:2] == (0, "aaaaa5")
+    assert run(TYPE_ERROR)[:2] == (53, "1")
+    assert run(DIVISION_BY_ZERO)[:2] == (57, "3")
+
+
+# --optimize option of the command line gives the same output, exit code and --insts statistic
+def test_optimize_option(tmp_path):
+    (tmp_path / "program.xml").write_bytes(to_xml(CALLS))
+    (tmp_path / "input.txt").write_bytes(b"")
+    results = []
+    for extra in ([], ["--optimize=dataflow,types,peephole,quicken"]):
+        completed = subprocess.run([sys.executable, os.path.join(ROOT, "interpret.py"), "--source=program.xml",
+                                    "--input=input.txt", "--stats=stats.txt", "--insts"] + extra,
+                                   cwd=tmp_path, capture_output=True)
+        results.append((completed.returncode, completed.stdout, (tmp_path / "stats.txt").read_text()))
+    assert results[0] == results[1]
+
+
+# programs, in which a variable has a different type at runtime than on some other path to the instruction,
+# the type error must not be hidden by a handler without type checks
+WRONG_TYPES = {
+    "merge": """
+DEFVAR GF@x
+MOVE GF@x int@1
+JUMPIFEQ add GF@x int@2
+MOVE GF@x string@a
+LABEL add
+ADD GF@x GF@x int@1
+WRITE GF@x
+""",
+    "loop": """
+DEFVAR GF@x
+DEFVAR GF@i
+MOVE GF@x int@1
+MOVE GF@i int@0
+LABEL loop
+ADD GF@i GF@i GF@x
+MOVE GF@x string@a
+JUMPIFNEQ loop GF@i int@5
+""",
+    "call": """
+DEFVAR GF@x
+MOVE GF@x int@1
+CALL change
+ADD GF@x GF@x int@1
+WRITE GF@x
+EXIT int@0
+LABEL change
+MOVE GF@x bool@true
+RETURN
+""",
+    "call_sites": """
+DEFVAR GF@a
+DEFVAR GF@r
+MOVE GF@a int@1
+CALL increment
+WRITE GF@r
+MOVE GF@a float@0x1p+0
+CALL increment
+WRITE GF@r
+EXIT int@0
+LABEL increment
+ADD GF@r GF@a int@1
+RETURN
+""",
+    "frame": """
+CREATEFRAME
+DEFVAR TF@x
+MOVE TF@x int@1
+WRITE TF@x
+CREATEFRAME
+DEFVAR TF@x
+MOVE TF@x string@a
+SUB TF@x TF@x int@1
+""",
+    "stack": """
+DEFVAR GF@x
+MOVE GF@x int@1
+PUSHS string@a
+POPS GF@x
+MUL GF@x GF@x int@2
+""",
+    "read": """
+DEFVAR GF@x
+MOVE GF@x int@1
+READ GF@x int
+ADD GF@x GF@x int@1
+""",
+    "relation": """
+DEFVAR GF@x
+DEFVAR GF@r
+MOVE GF@x int@1
+LT GF@r GF@x int@2
+MOVE GF@x nil@nil
+LT GF@r GF@x int@2
+""",
+}
+
+
+@pytest.mark.parametrize("passes", [["types"], list(interpret.OPTIMIZATIONS)])
+@pytest.mark.parametrize("name", WRONG_TYPES)
+def test_wrong_type_is_error(name, passes):
+    result = run(WRONG_TYPES[name], passes, "abc\n")
+    assert result[0] == 53
+    assert result == run(WRONG_TYPES[name], (), "abc\n")
+
+
+# operands of ADD and JUMPIFEQ are integers in iterations, in which the condition holds, and floats otherwise
+POLYMORPHIC = """
+DEFVAR GF@i
+DEFVAR GF@x
+DEFVAR GF@r
+DEFVAR GF@b
+MOVE GF@i int@0
+MOVE GF@b bool@false
+LABEL loop
+NOT GF@b GF@b
+MOVE GF@x int@1
+JUMPIFEQ add %s
+MOVE GF@x float@0x1p+0
+LABEL add
+ADD GF@r GF@x GF@x
+WRITE GF@r
+JUMPIFEQ skip GF@r GF@x
+WRITE string@\\032
+LABEL skip
+ADD GF@i GF@i int@1
+JUMPIFNEQ loop GF@i int@12
+"""
+
+
+# operands alternate between integers and floats, so guards of quickened instructions keep failing, until
+# they stay generic
+def test_quickened_instruction_is_deoptimized():
+    source = POLYMORPHIC % "GF@b bool@true"
+    program = interpret.load_program(io.BytesIO(to_xml(source)))
+    interpret.optimize_program(program, ["quicken"])
+
+    # code is shared, so the second run starts with instructions, that were de-specialized by the first one
+    for attempt in range(2):
+        output = io.StringIO()
+        interpreter = interpret.Interpreter(program, io.BytesIO(), output, io.StringIO())
+        assert (interpreter.run(), output.getvalue(), interpreter.instruction_counter) == run(source)
+
+    assert max(program.misses.values()) == interpret.QUICKEN_LIMIT
+    handlers = [handler for handler, arguments in program.code]
+    assert interpret.Interpreter.check_add in handlers
+    assert interpret.Interpreter.check_jumpifeq in handlers
+
+
+# integer only in the first iteration, so the instruction is specialized again after every miss, but it never reaches the limit
+def test_quickened_instruction_is_specialized_again():
+    source = POLYMORPHIC % "GF@i int@0"
+    program = interpret.load_program(io.BytesIO(to_xml(source)))
+    interpret.optimize_program(program, list(interpret.OPTIMIZATIONS))
+
+    output = io.StringIO()
+    interpreter = interpret.Interpreter(program, io.BytesIO(), output, io.StringIO())
+    assert (interpreter.run(), output.getvalue(), interpreter.instruction_counter) == run(source)
+    assert 0 < max(program.misses.values()) < interpret.QUICKEN_LIMIT